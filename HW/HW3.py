@@ -4,6 +4,8 @@ from anthropic import Anthropic
 import requests
 from bs4 import BeautifulSoup
 
+from utils.context_budget import assemble_context, context_budget, format_context_report
+
 def read_url_content(url):
     """
     Fetch and extract text content from a URL
@@ -52,8 +54,8 @@ def hw3():
     
     - **URL Input**: Provide up to 2 URLs whose content will be used as context
     - **LLM Selection**: Choose between OpenAI GPT-4o and Anthropic Claude Sonnet 4.5
-    - **Conversation Memory**: Uses a 6-message buffer (3 user-assistant exchanges) to maintain context
-    - **System Prompt**: URL content is embedded in the system prompt and never discarded
+    - **Conversation Memory**: Sends as many recent messages as fit the model's token budget to maintain context
+    - **System Prompt**: URL content is embedded in the system prompt, cut short if it doesn't fit the budget
     
     The chatbot will answer questions based on the provided URLs while maintaining conversational memory.
     """)
@@ -85,6 +87,7 @@ def hw3():
             ["OpenAI (GPT-4o)", "Anthropic (Claude Sonnet 4.5)"],
             help="Choose which AI model to use for responses"
         )
+        model = "gpt-4o" if llm_vendor == "OpenAI (GPT-4o)" else "claude-sonnet-4-20250514"
         
         st.divider()
         
@@ -122,10 +125,13 @@ def hw3():
         
         st.header("💬 Chat Controls")
         st.write(f"**Total messages:** {len(st.session_state.messages)}")
-        st.write(f"**Messages in buffer:** {min(4, len(st.session_state.messages))}")
+        st.write(f"**Context budget:** {context_budget(model):,} tokens")
+        if "hw3_context_report" in st.session_state:
+            st.caption(format_context_report(st.session_state.hw3_context_report))
         
         if st.button("🗑️ Clear Chat History"):
             st.session_state.messages = []
+            st.session_state.pop("hw3_context_report", None)
             # Clear URL content too
             if "url1_content" in st.session_state:
                 del st.session_state.url1_content
@@ -133,33 +139,34 @@ def hw3():
                 del st.session_state.url2_content
             st.rerun()
     
-    # Create system prompt with URL context
+    # System prompt; the URL content goes with it as context chunks
     def get_system_prompt():
-        prompt = """You are a helpful assistant. Answer questions based on the provided context when relevant."""
+        return "You are a helpful assistant. Answer questions based on the provided context when relevant.\n\n"
+    
+    def get_url_chunks():
+        chunks = []
         
         if "url1_content" in st.session_state:
-            prompt += f"\n\nContext from URL 1:\n{st.session_state.url1_content}"
+            chunks.append(f"Context from URL 1:\n{st.session_state.url1_content}\n\n")
         
         if "url2_content" in st.session_state:
-            prompt += f"\n\nContext from URL 2:\n{st.session_state.url2_content}"
+            chunks.append(f"Context from URL 2:\n{st.session_state.url2_content}\n\n")
         
-        return {"role": "system", "content": prompt}
+        return chunks
     
     # Display all previous messages
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
     
-    # Function to get buffered messages (last 6 messages = 3 exchanges)
+    # Function to get buffered messages: the system prompt, the last
+    # exchanges, and as much URL content and older history as fit the
+    # model's token budget (URL content is cut short rather than dropped)
     def get_buffered_messages():
-        system_prompt = get_system_prompt()
-        buffered = [system_prompt]  # Always include system prompt
-        
-        # Get last 6 messages (3 user + 3 assistant = 3 exchanges)
-        recent = st.session_state.messages[-6:] if len(st.session_state.messages) > 6 else st.session_state.messages
-        
-        buffered.extend(recent)
-        return buffered
+        messages, report = assemble_context(model, get_system_prompt(), st.session_state.messages,
+                                            get_url_chunks())
+        st.session_state.hw3_context_report = report
+        return messages
     
     # Get user input
     if prompt := st.chat_input("Ask a question about the URLs or anything else..."):
@@ -181,7 +188,7 @@ def hw3():
             if llm_vendor == "OpenAI (GPT-4o)":
                 # OpenAI API call
                 stream = openai_client.chat.completions.create(
-                    model="gpt-4o",
+                    model=model,
                     messages=messages_to_send,
                     stream=True
                 )
@@ -198,7 +205,7 @@ def hw3():
                 
                 # Anthropic API call
                 with anthropic_client.messages.stream(
-                    model="claude-sonnet-4-20250514",
+                    model=model,
                     max_tokens=4096,
                     system=system_content,
                     messages=anthropic_messages
@@ -1,36 +1,36 @@
 import streamlit as st
-from openai import OpenAI
-import sys
-import json
-import re
-from pathlib import Path
-from bs4 import BeautifulSoup
 
-__import__('pysqlite3')
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-
-import chromadb
+from utils.answer_cache import ANSWER_CACHE_ENABLED, ToolAnswerCache, history_key
+from utils.context_budget import assemble_context, format_context_report
+from utils.mmr import query_mmr
+from utils.org_pipeline import ORG_COLLECTION_NAME, ORG_DB_PATH
+from utils.query_cache import embed_query
+from utils.resources import check_org_db, db_version, get_openai_client, get_retriever
+from utils.speculative import SPECULATIVE_RETRIEVAL, SpeculativeRetrieval
+from utils.streaming import stream_with_tools
+from utils.tool_executor import ToolExecutor
 
 def hw5():
 
-    if 'openai_client' not in st.session_state or 'HW4_VectorDB' not in st.session_state:
-        st.session_state.openai_client = OpenAI(api_key=st.secrets.OPENAI_API_KEY)
-        chroma_client = chromadb.PersistentClient(path='./ChromaDB_for_HW4')
-        collection = chroma_client.get_or_create_collection('HW4Collection')
-        st.session_state.HW4_VectorDB = collection
+    # Uses the prebuilt student org DB from build_orgs_db.py; fail fast
+    # instead of querying an empty or out-of-date collection
+    if 'org_db_checked' not in st.session_state:
+        problem = check_org_db()
+        if problem:
+            st.error(f"{problem} Run `python build_orgs_db.py` to build it.")
+            st.stop()
+        st.session_state.org_db_checked = True
+
+    # Shared by all sessions; bound to locals because tools run on worker
+    # threads, which should not touch st.session_state
+    client = get_openai_client()
+    retriever = get_retriever(ORG_DB_PATH, ORG_COLLECTION_NAME)
 
     def relevant_club_info(query):
-        client = st.session_state.openai_client
-        response = client.embeddings.create(
-            input=query,
-            model='text-embedding-3-small'
-        )
-        query_embedding = response.data[0].embedding
+        query_embedding = embed_query(client, query, dimensions=retriever.dimensions)
 
-        results = st.session_state.HW4_VectorDB.query(
-            query_embeddings=[query_embedding],
-            n_results=5
-        )
+        # 4 diverse chunks (MMR over the top 16) instead of the plain top 5
+        results = query_mmr(retriever, query_embedding, k=4)
 
         context = ""
         for doc in results['documents'][0]:
@@ -73,46 +73,55 @@ def hw5():
             st.markdown(prompt)
         st.session_state.hw5_messages.append({"role": "user", "content": prompt})
 
-        buffered_messages = st.session_state.hw5_messages[-10:]
-
-        messages_to_send = [
-            {"role": "system", "content": "You are a helpful chatbot that answers questions about student organizations at Syracuse University. Use the relevant_club_info function to look up information when needed."},
-        ]
-        messages_to_send.extend(buffered_messages)
-
-        client = st.session_state.openai_client
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages_to_send,
-            tools=tools,
-            tool_choice="auto"
+        # As much recent history as fits the model's token budget, leaving
+        # room for the search results the tools add during the turn
+        messages_to_send, context_report = assemble_context(
+            "gpt-4o-mini",
+            "You are a helpful chatbot that answers questions about student organizations at Syracuse University. Use the relevant_club_info function to look up information when needed.",
+            st.session_state.hw5_messages,
+            reserve_for_tools=True
         )
-
-        response_message = response.choices[0].message
-
-        if response_message.tool_calls:
-            tool_call = response_message.tool_calls[0]
-            query = json.loads(tool_call.function.arguments)["query"]
-            context = relevant_club_info(query)
-
-            messages_to_send.append(response_message)
-            messages_to_send.append({
-                "role": "tool",
-                "tool_call_id": tool_call.id,
-                "content": context
-            })
-
-            final_response = client.chat.completions.create(
+        st.sidebar.caption(format_context_report(context_report))
+
+        # ---- Semantic answer cache ----
+        # Looked up after the first tool round: a close enough question whose
+        # searches returned the same chunks, after the same conversation,
+        # against this build of the DB gets the answer that was given then
+        answer_cache = None
+        if ANSWER_CACHE_ENABLED:
+            answer_cache = ToolAnswerCache(
+                'hw5',
+                embedding=embed_query(client, prompt, dimensions=retriever.dimensions),
                 model="gpt-4o-mini",
-                messages=messages_to_send,
-                stream=True
+                version=db_version(ORG_DB_PATH),
+                context=history_key(messages_to_send[1:-1])
             )
 
-            with st.chat_message("assistant"):
-                response_text = st.write_stream(final_response)
-        else:
-            with st.chat_message("assistant"):
-                response_text = response_message.content
-                st.markdown(response_text)
+        functions = {'relevant_club_info': relevant_club_info}
+
+        # Opt-in: search for the prompt itself while the model decides, and
+        # reuse that result if the model's own query is close enough
+        speculation = None
+        if SPECULATIVE_RETRIEVAL:
+            speculation = SpeculativeRetrieval(client, relevant_club_info, dimensions=retriever.dimensions)
+            speculation.start(prompt)
+            functions['relevant_club_info'] = speculation.tool
+
+        # Every tool call in a turn runs in parallel; the model may look
+        # things up for a few rounds, and the answer streams as it's written
+        executor = ToolExecutor(
+            functions,
+            client=client,
+            embed_args={'relevant_club_info': 'query'},
+            dimensions=retriever.dimensions
+        )
+
+        with st.chat_message("assistant"):
+            response_text = st.write_stream(
+                stream_with_tools(client, "gpt-4o-mini", messages_to_send, tools, executor,
+                                  spinner="Looking up student organizations...", answer_cache=answer_cache)
+            )
+        if speculation is not None:
+            speculation.finish()
 
         st.session_state.hw5_messages.append({"role": "assistant", "content": response_text})
\ No newline at end of file
@@ -1,19 +1,25 @@
 import streamlit as st
-import sys
-import json
-from openai import OpenAI
+import os
+from datetime import date
 
-__import__('pysqlite3')
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-import chromadb
+from utils.answer_cache import ANSWER_CACHE_ENABLED, ToolAnswerCache, get_answer_cache, history_key
+from utils.bm25 import BM25_INDEX_NAME, reciprocal_rank_fusion
+from utils.context_budget import assemble_context, format_context_report
+from utils.mmr import DEFAULT_FETCH_FACTOR, query_mmr, rerank_ids
+from utils.query_cache import embed_query as cached_query_embedding, get_query_cache
+from utils.resources import (NEWS_COLLECTION_NAME, NEWS_DB_PATH, db_version, get_bm25_index,
+                             get_company_names, get_openai_client, get_retriever, get_risk_index)
+from utils.risk_index import RISK_INDEX_NAME, RISK_QUERY
+from utils.speculative import SPECULATIVE_RETRIEVAL, SpeculativeRetrieval, get_speculation_stats
+from utils.streaming import stream_with_tools
+from utils.tool_executor import ToolExecutor
 
 def hw7():
     st.title('HW 7: Law Firm News Monitor')
     st.caption("Ask about client news. Try: 'Find the most interesting news' or 'Find news about JPMorgan'")
 
-    # ---- OPENAI CLIENT ----
-    if 'openai_client' not in st.session_state:
-        st.session_state.openai_client = OpenAI(api_key=st.secrets.OPENAI_API_KEY)
+    # ---- OPENAI CLIENT (shared by all sessions) ----
+    client = get_openai_client()
 
     # ---- SIDEBAR: MODEL SELECTION ----
     with st.sidebar:
@@ -21,65 +27,151 @@ def hw7():
         use_advanced = st.checkbox("Use advanced model (GPT-4.1)", value=False)
         model = 'gpt-4.1' if use_advanced else 'gpt-4.1-mini'
         st.caption(f"Current model: {model}")
+        cache_stats = get_query_cache().stats()
+        st.caption(f"Query embedding cache: {cache_stats['hit_rate']:.0%} hit rate "
+                   f"({cache_stats['hits']} hits, {cache_stats['entries']} entries)")
+        if ANSWER_CACHE_ENABLED:
+            answer_stats = get_answer_cache().stats()
+            st.caption(f"Answer cache: {answer_stats['hit_rate']:.0%} hit rate "
+                       f"({answer_stats['hits']} hits, {answer_stats['entries']} entries)")
+        speculate = st.checkbox("Speculative retrieval", value=SPECULATIVE_RETRIEVAL,
+                                help="Search for your question while the model decides which tool to use")
+        if speculate:
+            spec_stats = get_speculation_stats().stats()
+            st.caption(f"Speculative retrieval: {spec_stats['hit_rate']:.0%} hit rate "
+                       f"({spec_stats['hits']} hits, {spec_stats['misses']} misses, "
+                       f"{spec_stats['unused']} unused)")
 
-    # ---- LOAD CHROMADB (only once per session) ----
-    if 'HW7_VectorDB' not in st.session_state:
-        try:
-            chroma_client = chromadb.PersistentClient(path='./news_chroma_db')
-            collection = chroma_client.get_collection('news_articles')
-            st.session_state.HW7_VectorDB = collection
-            st.success(f"Loaded {collection.count()} articles!")
-        except Exception as e:
-            st.error(f"Error loading ChromaDB: {e}")
-            return
+    # ---- LOAD CHROMADB (once per server process, warmed at startup) ----
+    # Queries go through the configured retriever (in-memory NumPy by default)
+    try:
+        collection = get_retriever(NEWS_DB_PATH, NEWS_COLLECTION_NAME)
+    except Exception as e:
+        st.error(f"Error loading ChromaDB: {e}")
+        return
+    if 'HW7_loaded' not in st.session_state:
+        st.success(f"Loaded {collection.count()} articles!")
+        st.session_state.HW7_loaded = True
+
+    # ---- BM25 KEYWORD INDEX AND RISK RANKING (written by build_db.py) ----
+    # Without the BM25 index, company searches fall back to vector search only
+    bm25 = get_bm25_index(os.path.join(NEWS_DB_PATH, BM25_INDEX_NAME))
+    risk_index = get_risk_index(os.path.join(NEWS_DB_PATH, RISK_INDEX_NAME))
+
+    # Everything the tools need is bound to locals here: tools run on
+    # worker threads, which should not touch st.session_state
 
-    collection = st.session_state.HW7_VectorDB
+    # Company names in the collection, for resolving the model's spelling
+    company_field, companies = get_company_names(NEWS_DB_PATH, NEWS_COLLECTION_NAME)
 
-    # ---- HELPER: Embed a query string ----
+    # ---- HELPER: Embed a query string (through the process-wide query cache) ----
     def embed_query(text):
-        client = st.session_state.openai_client
-        response = client.embeddings.create(
-            input=[text],
-            model='text-embedding-3-small'
-        )
-        return response.data[0].embedding
+        return cached_query_embedding(client, text, dimensions=collection.dimensions)
 
     # ---- HELPER: Format ChromaDB results for the LLM ----
-    def format_results(results):
-        docs = results['documents'][0]
-        metas = results['metadatas'][0]
+    def format_results(docs, metas):
         output = []
         for i, (doc, meta) in enumerate(zip(docs, metas)):
+            # Duplicate stories are collapsed at ingest; list who else they cover
+            also = f"Also covers: {meta['duplicate_companies']}\n" if meta.get('duplicate_companies') else ""
             output.append(
                 f"[Article {i+1}]\n"
                 f"Company: {meta['company']}\n"
+                f"{also}"
                 f"Date: {meta['date'][:10]}\n"
                 f"URL: {meta['url']}\n"
                 f"Content: {doc[:500]}\n"
             )
         return "\n---\n".join(output)
 
+    # ---- HELPER: Resolve a company name against the ones we have ----
+    # Case-insensitive; an exact match wins, otherwise every company whose
+    # name contains the given one (so "jpmorgan" finds "JPMorgan Chase")
+    def resolve_company(name):
+        wanted = name.strip().lower()
+        exact = [c for c in companies if c.lower() == wanted]
+        if exact:
+            return exact
+        return [c for c in companies if wanted in c.lower()]
+
+    # ---- HELPER: Build a metadata filter from the optional tool arguments ----
+    # Dates are matched on the integer `day` field (days since 2000-01-01).
+    # Returns (where, error); where is None when there is nothing to filter.
+    def build_filter(company=None, start_date=None, end_date=None):
+        clauses = []
+        if company:
+            matches = resolve_company(company)
+            if not matches:
+                return None, f"No client named '{company}' in the news database."
+            if company_field == 'companies':
+                matched = [{'companies': {'$contains': name}} for name in matches]
+                clauses.append(matched[0] if len(matched) == 1 else {'$or': matched})
+            else:
+                clauses.append({'company': matches[0]} if len(matches) == 1 else {'company': {'$in': matches}})
+        try:
+            if start_date:
+                clauses.append({'day': {'$gte': (date.fromisoformat(start_date[:10]) - date(2000, 1, 1)).days}})
+            if end_date:
+                clauses.append({'day': {'$lte': (date.fromisoformat(end_date[:10]) - date(2000, 1, 1)).days}})
+        except ValueError:
+            return None, "Dates must be in YYYY-MM-DD format."
+        if not clauses:
+            return None, None
+        return (clauses[0] if len(clauses) == 1 else {'$and': clauses}), None
+
     # ---- TOOL: Find most interesting news ----
-    def find_interesting_news(n=5):
-        query_vec = embed_query(
-            "significant legal regulatory financial risk lawsuit controversy scandal"
-        )
-        results = collection.query(
-            query_embeddings=[query_vec],
-            n_results=n * 2,
-            include=['documents', 'metadatas', 'distances']
-        )
-        return format_results(results)
+    # Reads the top of the risk ranking precomputed by build_db.py; falls
+    # back to a similarity search against the risk query if it is missing.
+    # Either way, MMR drops near-duplicate stories from the candidates.
+    def find_interesting_news(n=5, company=None, start_date=None, end_date=None):
+        where, error = build_filter(company, start_date, end_date)
+        if error:
+            return error
+
+        if risk_index is not None:
+            allowed = set(collection.ids_matching(where)) if where else None
+            top_ids, top_scores = [], []
+            for doc_id, score in risk_index['ranked']:
+                if allowed is None or doc_id in allowed:
+                    top_ids.append(doc_id)
+                    top_scores.append(score)
+                    if len(top_ids) == n * DEFAULT_FETCH_FACTOR:
+                        break
+            docs, metas = rerank_ids(collection, top_ids, n, relevance=top_scores)
+            return format_results(docs, metas) or "No articles match those filters."
+
+        results = query_mmr(collection, embed_query(RISK_QUERY), n, where=where)
+        return format_results(results['documents'][0], results['metadatas'][0]) \
+            or "No articles match those filters."
 
     # ---- TOOL: Find news about a specific company or topic ----
-    def find_news_about(query, n=5):
+    # Hybrid search: BM25 catches exact company names, vectors catch the
+    # topic, and reciprocal rank fusion merges the two rankings. MMR then
+    # picks n diverse articles from the top of the fused ranking. Company
+    # and date filters narrow both searches to the matching articles first.
+    def find_news_about(query, n=5, company=None, start_date=None, end_date=None, candidates=20):
+        where, error = build_filter(company, start_date, end_date)
+        if error:
+            return error
         query_vec = embed_query(query)
-        results = collection.query(
+        if bm25 is None:
+            results = query_mmr(collection, query_vec, n, fetch_k=candidates, where=where)
+            return format_results(results['documents'][0], results['metadatas'][0]) \
+                or "No articles match those filters."
+
+        vector_results = collection.query(
             query_embeddings=[query_vec],
-            n_results=n * 2,
-            include=['documents', 'metadatas', 'distances']
+            n_results=candidates,
+            where=where,
+            include=[]
         )
-        return format_results(results)
+        allowed = set(collection.ids_matching(where)) if where else None
+        keyword_ids = [doc_id for doc_id, _ in bm25.search(query, k=candidates, allowed=allowed)]
+        fused_ids = reciprocal_rank_fusion([vector_results['ids'][0], keyword_ids],
+                                           limit=n * DEFAULT_FETCH_FACTOR)
+
+        docs, metas = rerank_ids(collection, fused_ids, n)
+        return format_results(docs, metas) or "No articles match those filters."
 
     # ---- FUNCTION CALLING TOOLS DEFINITION ----
     tools = [
@@ -87,11 +179,14 @@ def hw7():
             "type": "function",
             "function": {
                 "name": "find_interesting_news",
-                "description": "Retrieves the most newsworthy and interesting articles across all clients. Use when the user asks for interesting news, top news, or what's happening.",
+                "description": "Retrieves the most newsworthy and interesting articles across all clients. Use when the user asks for interesting news, top news, or what's happening. Can be limited to one client and/or a date range.",
                 "parameters": {
                     "type": "object",
                     "properties": {
-                        "n": {"type": "integer", "description": "Number of articles to return (default 5)"}
+                        "n": {"type": "integer", "description": "Number of articles to return (default 5)"},
+                        "company": {"type": "string", "description": "Only return articles about this client company"},
+                        "start_date": {"type": "string", "description": "Only return articles published on or after this date (YYYY-MM-DD)"},
+                        "end_date": {"type": "string", "description": "Only return articles published on or before this date (YYYY-MM-DD)"}
                     },
                     "required": []
                 }
@@ -101,12 +196,15 @@ def hw7():
             "type": "function",
             "function": {
                 "name": "find_news_about",
-                "description": "Retrieves news articles about a specific company or topic. Use when the user asks about a particular company or subject.",
+                "description": "Retrieves news articles about a specific company or topic. Use when the user asks about a particular company or subject. Pass company and/or start_date/end_date to restrict the search to one client or a date range.",
                 "parameters": {
                     "type": "object",
                     "properties": {
                         "query": {"type": "string", "description": "The company name or topic to search for"},
-                        "n": {"type": "integer", "description": "Number of articles to return (default 5)"}
+                        "n": {"type": "integer", "description": "Number of articles to return (default 5)"},
+                        "company": {"type": "string", "description": "Only return articles about this client company"},
+                        "start_date": {"type": "string", "description": "Only return articles published on or after this date (YYYY-MM-DD)"},
+                        "end_date": {"type": "string", "description": "Only return articles published on or before this date (YYYY-MM-DD)"}
                     },
                     "required": ["query"]
                 }
@@ -147,51 +245,57 @@ Be concise and professional."""
         with st.chat_message('user'):
             st.markdown(user_input)
 
+        # As much recent history as fits the model's token budget, leaving
+        # room for the articles the tools add during the turn
+        messages, context_report = assemble_context(model, system_prompt, st.session_state.hw7_messages,
+                                                    reserve_for_tools=True)
+        st.sidebar.caption(format_context_report(context_report))
+
+        # ---- Semantic answer cache ----
+        # Looked up after the first tool round: a close enough question that
+        # made the same tool calls (client, dates, n) and got the same
+        # articles back, after the same conversation and with the same model,
+        # against this build of the DB gets the answer that was given then
+        answer_cache = None
+        if ANSWER_CACHE_ENABLED:
+            answer_cache = ToolAnswerCache(
+                'hw7',
+                embedding=embed_query(user_input),
+                model=model,
+                version=db_version(NEWS_DB_PATH),
+                context=history_key(messages[1:-1])
+            )
+
+        functions = {
+            'find_interesting_news': find_interesting_news,
+            'find_news_about': find_news_about
+        }
+
+        # Search for the question itself while the model decides; reused
+        # only if the model asks find_news_about for something close
+        # enough, with no filters
+        speculation = None
+        if speculate:
+            speculation = SpeculativeRetrieval(client, find_news_about, dimensions=collection.dimensions)
+            speculation.start(user_input)
+            functions['find_news_about'] = speculation.tool
+
+        # All tool calls in a turn run in parallel (e.g. news about three
+        # companies at once), for up to a few rounds; the answer streams
+        # as it's written
+        executor = ToolExecutor(
+            functions,
+            client=client,
+            embed_args={'find_news_about': 'query'},
+            dimensions=collection.dimensions
+        )
+
         with st.chat_message('assistant'):
-            with st.spinner('Searching news...'):
-
-                messages = [{'role': 'system', 'content': system_prompt}]
-                messages += st.session_state.hw7_messages
-
-                client = st.session_state.openai_client
-                response = client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    tools=tools,
-                    tool_choice='auto'
-                )
-
-                resp_msg = response.choices[0].message
-
-                if resp_msg.tool_calls:
-                    tool_call = resp_msg.tool_calls[0]
-                    tool_name = tool_call.function.name
-                    tool_args = json.loads(tool_call.function.arguments)
-
-                    if tool_name == 'find_interesting_news':
-                        tool_result = find_interesting_news(n=tool_args.get('n', 5))
-                    elif tool_name == 'find_news_about':
-                        tool_result = find_news_about(
-                            query=tool_args['query'],
-                            n=tool_args.get('n', 5)
-                        )
-
-                    messages.append(resp_msg)
-                    messages.append({
-                        'role': 'tool',
-                        'tool_call_id': tool_call.id,
-                        'content': tool_result
-                    })
-
-                    final_response = client.chat.completions.create(
-                        model=model,
-                        messages=messages,
-                        stream=True
-                    )
-                    reply = st.write_stream(final_response)
-
-                else:
-                    reply = resp_msg.content
-                    st.markdown(reply)
+            reply = st.write_stream(
+                stream_with_tools(client, model, messages, tools, executor, spinner='Searching news...',
+                                  answer_cache=answer_cache)
+            )
+        if speculation is not None:
+            speculation.finish()
 
         st.session_state.hw7_messages.append({'role': 'assistant', 'content': reply})
\ No newline at end of file
@@ -1,6 +1,8 @@
 import streamlit as st
 from openai import OpenAI
 
+from utils.context_budget import assemble_context, context_budget, format_context_report
+
 def lab3():
     st.title("🤖 Lab 3 - Chatbot with Memory")
     
@@ -38,15 +40,12 @@ def lab3():
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
     
-    # Function to get buffered messages (last 2 exchanges)
+    # Function to get buffered messages: the system prompt plus as many
+    # recent messages as fit the model's token budget
     def get_buffered_messages():
-        buffered = [SYSTEM_PROMPT]  # Always include system prompt
-        
-        # Get last 4 messages (2 user + 2 assistant)
-        recent = st.session_state.messages[-4:] if len(st.session_state.messages) > 4 else st.session_state.messages
-        
-        buffered.extend(recent)
-        return buffered
+        messages, report = assemble_context("gpt-4o-mini", SYSTEM_PROMPT["content"], st.session_state.messages)
+        st.session_state.lab3_context_report = report
+        return messages
     
     # Get user input
     if prompt := st.chat_input("What would you like to know?"):
@@ -85,8 +84,11 @@ def lab3():
     with st.sidebar:
         st.header("💬 Chat Controls")
         st.write(f"**Total messages:** {len(st.session_state.messages)}")
-        st.write(f"**Messages in buffer:** {min(4, len(st.session_state.messages))}")
+        st.write(f"**Context budget:** {context_budget('gpt-4o-mini'):,} tokens")
+        if "lab3_context_report" in st.session_state:
+            st.caption(format_context_report(st.session_state.lab3_context_report))
         
         if st.button("🗑️ Clear Chat History"):
             st.session_state.messages = []
+            st.session_state.pop("lab3_context_report", None)
             st.rerun()
\ No newline at end of file
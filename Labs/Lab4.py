@@ -1,82 +1,49 @@
 import streamlit as st
-from openai import OpenAI
-import sys
-from pathlib import Path
-from PyPDF2 import PdfReader
 
-#A fix for working with ChromaDB on Streamlit Community Cloud
+from utils.async_ingest import ingest_batches
+from utils.context_budget import assemble_context, format_context_report
+from utils.pdf_pipeline import chunk_pages, extract_folder
+from utils.mmr import query_mmr
+from utils.query_cache import embed_query
+from utils.resources import get_chroma_client, get_openai_client
+from utils.retrievers import make_retriever
 
-__import__ ('pysqlite3')
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+#### POPULATE COLLECTION WITH PDFs ####
+# Extracts every syllabus page by page (in parallel, cached by file
+# hash, see utils/pdf_pipeline.py), splits the pages into token-bounded
+# chunks, then embeds them concurrently and stores them with their
+# source file, page number and offsets
+def load_pdfs_to_collection(folder_path, collection):
+    extracted = extract_folder(folder_path)
 
-import chromadb
+    records = []
+    for pdf_file, pages in extracted:
+        records.extend(chunk_pages(pdf_file.name, pages))
 
-def lab4():
+    batches = [records[i:i + 100] for i in range(0, len(records), 100)]
+    ingest_batches(batches, collection, api_key=st.secrets.OPENAI_API_KEY)
 
-    #### Using Chroma DB with OpenAI Embeddings ####
+    return len(extracted)
 
-    # Create OpenAI Client
-    if 'openai_client' not in st.session_state:
-        st.session_state.openai_client = OpenAI(api_key=st.secrets.OPENAI_API_KEY)
-
-    # A function that will add documents to collection
-    # Collection = collection, already established
-    # text = extracted text from PDF files
-    # Embeddings inserted into the collection from OpenAI
-    def add_to_collection(collection, text, file_name):
-
-        # Create an embedding
-        client = st.session_state.openai_client
-        response = client.embeddings.create(
-            input=text,
-            model='text-embedding-3-small'
-        )
+# Opened (and built on first run) once per server process, shared by all sessions
+@st.cache_resource(show_spinner="Loading course syllabi...")
+def get_lab4_retriever():
+    # Page-level chunks live in their own collection (the old one held whole PDFs)
+    collection = get_chroma_client('./ChromaDB_for_Lab').get_or_create_collection('Lab4Chunks')
 
-        # Get the embedding
-        embedding = response.data[0].embedding
+    if collection.count() == 0:
+        load_pdfs_to_collection('./Labs/Lab-04-Data/', collection)
 
-        #Add embedding and document to ChromaDB
-        collection.add(
-            documents=[text],
-            ids=[file_name],
-            embeddings=[embedding]
-        )
+    # Queries go through the configured retriever (in-memory NumPy by default)
+    return make_retriever(collection)
 
+def lab4():
 
-    #### EXTRACT TEXT FROM PDF ####
-    #This function extracts text from each syllabus
-    # to passs to add_to_collection
-    def extract_text_from_pdf(pdf_path):
-        reader = PdfReader(pdf_path)
-        text = ""
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text
-        return text
-
-    #### POPULATE COLLECTION WITH PDFs ####
-    # This function uses extract_text_from_pdf
-    # and add_to_collection to put syllabi in ChromaDB collection
-    def load_pdfs_to_collection(folder_path, collection):
-        pdf_folder = Path(folder_path)
-        pdf_files = list(pdf_folder.glob('*.pdf'))
-
-        for pdf_file in pdf_files:
-            text = extract_text_from_pdf(pdf_file)
-            file_name = pdf_file.name
-            add_to_collection(collection, text, file_name)
-
-        return len(pdf_files)
-
-    if 'Lab4_VectorDB' not in st.session_state:
-        chroma_client = chromadb.PersistentClient(path='./ChromaDB_for_Lab')
-        collection = chroma_client.get_or_create_collection('Lab4Collection')
-        
-        if collection.count() == 0:
-            load_pdfs_to_collection('./Labs/Lab-04-Data/', collection)
-        
-        st.session_state.Lab4_VectorDB = collection
+    #### Using Chroma DB with OpenAI Embeddings ####
+
+    # Shared OpenAI client and retriever
+    client = get_openai_client()
+    retriever = get_lab4_retriever()
 
     #### MAIN APP ####
     st.title('Lab 4: Chatbot using RAG')
@@ -97,28 +64,25 @@ def lab4():
         st.session_state.lab4_messages.append({"role": "user", "content": prompt})
 
         # Query the vector DB for relevant context
-        client = st.session_state.openai_client
-        response = client.embeddings.create(
-            input=prompt,
-            model='text-embedding-3-small'
-        )
-        query_embedding = response.data[0].embedding
+        query_embedding = embed_query(client, prompt, dimensions=retriever.dimensions)
 
-        results = st.session_state.Lab4_VectorDB.query(
-            query_embeddings=[query_embedding],
-            n_results=3
-        )
+        # MMR keeps 3 distinct chunks out of the top 12, so overlapping
+        # chunks of one page don't fill the context
+        results = query_mmr(retriever, query_embedding, k=3)
 
-        # Build context from the top 3 matching documents
-        context = ""
-        for i in range(len(results['documents'][0])):
-            context += results['documents'][0][i] + "\n\n"
-
-        # Send to LLM with context in system prompt
-        messages_to_send = [
-            {"role": "system", "content": "You are a helpful AI assistant. Use the following context to answer the question.If you are using information from the provided context, make that clear in your response.\n\n" + context},
+        # Context chunks labelled with their source, plus as much recent
+        # history as fits the model's token budget (chunks first)
+        chunks = [
+            f"[{meta['source']}, page {meta['page']}]\n{doc}\n\n"
+            for doc, meta in zip(results['documents'][0], results['metadatas'][0])
         ]
-        messages_to_send.extend(st.session_state.lab4_messages)
+        messages_to_send, context_report = assemble_context(
+            "gpt-4o-mini",
+            "You are a helpful AI assistant. Use the following context to answer the question.If you are using information from the provided context, make that clear in your response.\n\n",
+            st.session_state.lab4_messages,
+            chunks
+        )
+        st.sidebar.caption(format_context_report(context_report))
 
         # Stream the response
         with st.chat_message("assistant"):
@@ -3,6 +3,9 @@ import requests
 import json
 from openai import OpenAI
 
+from utils.streaming import stream_with_tools
+from utils.tool_executor import ToolExecutor
+
 def get_current_weather(location, units="imperial"):
     api_key = st.secrets["OPENWEATHER_API_KEY"]
     url = (
@@ -63,64 +66,53 @@ def lab5():
     )
 
     if st.button("Get Advice") and city:
-            with st.spinner("Checking the weather..."):
-                try:
-                    messages = [
-                        {
-                            "role": "system",
-                            "content": (
-                                "You are a helpful weather-based fashion and activity advisor. "
-                                "When the user provides a city, use the get_current_weather tool "
-                                "to fetch current conditions, then give friendly advice on what to wear "
-                                "and suggest appropriate outdoor activities. "
-                                "If no city is given, use 'Syracuse, NY, US' as the default."
-                            ),
-                        },
-                        {
-                            "role": "user",
-                            "content": f"What should I wear today in {city}? Also suggest some outdoor activities.",
-                        },
-                    ]
-
-                    response = client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=messages,
-                        tools=[weather_tool],
-                        tool_choice="auto",
-                    )
-
-                    response_message = response.choices[0].message
-
-                    if response_message.tool_calls:
-                        tool_call = response_message.tool_calls[0]
-                        args = json.loads(tool_call.function.arguments)
-                        location = args.get("location", "Syracuse, NY, US")
-                        weather_data = get_current_weather(location)
-
-                        st.subheader(f"📍 Current Weather in {weather_data['location']}")
-                        col1, col2, col3 = st.columns(3)
-                        col1.metric("Temperature", f"{weather_data['temperature']}{weather_data['units']}")
-                        col2.metric("Feels Like", f"{weather_data['feels_like']}{weather_data['units']}")
-                        col3.metric("Humidity", f"{weather_data['humidity']}%")
-                        st.caption(f"Conditions: {weather_data['description'].title()} | Low: {weather_data['temp_min']}{weather_data['units']} | High: {weather_data['temp_max']}{weather_data['units']}")
-
-                        messages.append(response_message)
-                        messages.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "content": json.dumps(weather_data),
-                        })
-
-                        final_response = client.chat.completions.create(
-                            model="gpt-4o-mini",
-                            messages=messages,
-                        )
-
-                        advice = final_response.choices[0].message.content
+            try:
+                messages = [
+                    {
+                        "role": "system",
+                        "content": (
+                            "You are a helpful weather-based fashion and activity advisor. "
+                            "When the user provides a city, use the get_current_weather tool "
+                            "to fetch current conditions, then give friendly advice on what to wear "
+                            "and suggest appropriate outdoor activities. "
+                            "If no city is given, use 'Syracuse, NY, US' as the default."
+                        ),
+                    },
+                    {
+                        "role": "user",
+                        "content": f"What should I wear today in {city}? Also suggest some outdoor activities.",
+                    },
+                ]
+
+                # Weather lookups made by the model this turn, for the metrics
+                lookups = []
+
+                def weather_lookup(location="Syracuse, NY, US"):
+                    weather_data = get_current_weather(location)
+                    lookups.append(weather_data)
+                    return json.dumps(weather_data)
+
+                # Runs on the script thread once the tool has answered, so it
+                # can draw the metrics above the advice that is still streaming
+                weather_area = st.container()
+
+                def show_weather(tool_calls, tool_messages):
+                    with weather_area:
+                        for weather_data in lookups:
+                            st.subheader(f"📍 Current Weather in {weather_data['location']}")
+                            col1, col2, col3 = st.columns(3)
+                            col1.metric("Temperature", f"{weather_data['temperature']}{weather_data['units']}")
+                            col2.metric("Feels Like", f"{weather_data['feels_like']}{weather_data['units']}")
+                            col3.metric("Humidity", f"{weather_data['humidity']}%")
+                            st.caption(f"Conditions: {weather_data['description'].title()} | Low: {weather_data['temp_min']}{weather_data['units']} | High: {weather_data['temp_max']}{weather_data['units']}")
                         st.subheader("👗 Clothing & Activity Suggestions")
-                        st.write(advice)
+                    lookups.clear()
 
-                except Exception as e:
-                    st.error(f"Something went wrong: {e}")
+                executor = ToolExecutor({"get_current_weather": weather_lookup})
+                st.write_stream(
+                    stream_with_tools(client, "gpt-4o-mini", messages, [weather_tool], executor,
+                                      on_tool_results=show_weather, spinner="Checking the weather...")
+                )
 
-lab5()
+            except Exception as e:
+                st.error(f"Something went wrong: {e}")
@@ -124,6 +124,3 @@ def lab9():
             updated_memories = current_memories + new_facts
             save_memories(updated_memories)
             st.rerun()
- 
- 
-lab9()
\ No newline at end of file
@@ -0,0 +1,86 @@
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+# Run from the repo root: python benchmarks/bench_org_parse.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.org_pipeline import find_initial_app_state, strip_tags
+
+# ===================================================================
+# Micro-benchmark: initialAppState extraction, before vs after
+# ===================================================================
+# "before" is the original HW4 code path: a non-greedy DOTALL regex to
+# find the JSON, json.loads on the match, and BeautifulSoup html.parser
+# to strip tags from the description. "after" is str.find + raw_decode
+# and the lxml tag stripper from utils/org_pipeline.py.
+
+
+def parse_before(content):
+    match = re.search(r'window\.initialAppState\s*=\s*({.*?});\s*</script>', content, re.DOTALL)
+    if not match:
+        return None
+    data = json.loads(match.group(1))
+    org = data.get('preFetchedData', {}).get('organization') or {}
+    raw = org.get('description', '') or ''
+    return BeautifulSoup(raw, 'html.parser').get_text(separator=' ').strip()
+
+
+def parse_after(content):
+    data = find_initial_app_state(content)
+    if not data:
+        return None
+    org = data.get('preFetchedData', {}).get('organization') or {}
+    raw = org.get('description', '') or ''
+    return strip_tags(raw)
+
+
+# Time fn on every page, best of `repeat` runs per page (in ms)
+def time_per_file(fn, pages, repeat):
+    timings = []
+    for content in pages:
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn(content)
+            best = min(best, time.perf_counter() - start)
+        timings.append(best * 1000)
+    return timings
+
+
+def summarize(label, timings):
+    ordered = sorted(timings)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{label:<8} total {sum(timings):8.1f} ms | per file: "
+          f"mean {statistics.mean(timings):.3f} ms, median {statistics.median(timings):.3f} ms, "
+          f"p99 {p99:.3f} ms, max {ordered[-1]:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark su_orgs page parsing")
+    parser.add_argument('--folder', default='./su_orgs/')
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per file (best is kept)")
+    args = parser.parse_args()
+
+    pages = [p.read_text(encoding='utf-8') for p in sorted(Path(args.folder).glob('*.html'))]
+    total_kb = sum(len(p) for p in pages) / 1024
+    print(f"{len(pages)} files, {total_kb:.0f} KB")
+
+    # Both paths must produce the same descriptions
+    mismatches = sum(1 for p in pages if parse_before(p) != parse_after(p))
+    print(f"Output mismatches: {mismatches}")
+
+    before = time_per_file(parse_before, pages, args.repeat)
+    after = time_per_file(parse_after, pages, args.repeat)
+    summarize('before', before)
+    summarize('after', after)
+    print(f"Speedup: {sum(before) / sum(after):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Run from the repo root: python benchmarks/bench_quantization.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# A fix for working with ChromaDB on Streamlit Community Cloud
+__import__('pysqlite3')
+sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+import chromadb
+
+from utils.retrievers import NumpyRetriever
+
+# ===================================================================
+# Index footprint and recall@k: shortened + quantized embeddings
+# ===================================================================
+# For each embedding size and storage format, reports the bytes held by the
+# NumPy index and recall@k against exact search over the full-size float32
+# vectors. text-embedding-3 embeddings are trained so that their leading
+# dimensions, renormalized, are what the API returns for a smaller
+# `dimensions`, so shortened vectors are simulated by truncating the full
+# ones.
+#
+# With --db-path/--collection the stored vectors of a real (full-size)
+# collection are used. Eval queries are --queries-file lines (embedded
+# through the cache, needs OPENAI_API_KEY) or, by default, perturbed stored
+# vectors. The synthetic default is clustered random data: its recall
+# numbers show the mechanics, not what our corpora will get, because random
+# vectors do not keep their meaning when truncated.
+
+FORMATS = [
+    ('float32', None, False),
+    ('int8', 'int8', False),
+    ('int8 + rescore', 'int8', True),
+    ('binary', 'binary', False),
+    ('binary + rescore', 'binary', True),
+]
+
+
+def synthetic_vectors(n, dims, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 30), dims))
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.7 * rng.standard_normal((n, dims))
+    return vectors.astype(np.float32)
+
+
+def load_vectors(db_path, name):
+    collection = chromadb.PersistentClient(path=db_path).get_collection(name)
+    stored = collection.get(include=['embeddings'])
+    return np.asarray(stored['embeddings'], dtype=np.float32)
+
+
+def embed_query_file(path):
+    from openai import OpenAI
+    from utils.embedding_cache import embed_texts
+    with open(path, encoding='utf-8') as f:
+        texts = [line.strip() for line in f if line.strip()]
+    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    return np.asarray(embed_texts(client, texts), dtype=np.float32)
+
+
+def truncate(vectors, dims):
+    short = vectors[:, :dims]
+    return short / np.linalg.norm(short, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark shortened and quantized embedding storage")
+    parser.add_argument('--db-path', help="Existing ChromaDB directory (default: synthetic data)")
+    parser.add_argument('--collection', help="Collection name inside --db-path")
+    parser.add_argument('--queries-file', help="Eval questions, one per line (embedded with the API)")
+    parser.add_argument('--n', type=int, default=1290, help="Synthetic corpus size")
+    parser.add_argument('--queries', type=int, default=200, help="Perturbed-vector queries")
+    parser.add_argument('--dims', type=int, nargs='+', default=[1536, 512, 256])
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.db_path:
+        vectors = load_vectors(args.db_path, args.collection)
+    else:
+        vectors = synthetic_vectors(args.n, max(args.dims), seed=0)
+    full_dims = vectors.shape[1]
+
+    if args.queries_file:
+        queries = embed_query_file(args.queries_file)
+    else:
+        rng = np.random.default_rng(1)
+        base = truncate(vectors, full_dims)[rng.integers(0, len(vectors), args.queries)]
+        queries = base + 0.5 * rng.standard_normal(base.shape).astype(np.float32) / np.sqrt(full_dims)
+
+    ids = [str(i) for i in range(len(vectors))]
+    empty = [''] * len(ids)
+    metas = [None] * len(ids)
+    baseline = NumpyRetriever(ids, vectors, empty, metas)
+    exact = baseline.query(queries, args.k, include=())['ids']
+    full_bytes = baseline.index_nbytes()
+    print(f"{len(ids)} vectors, {len(queries)} queries, recall@{args.k} vs float32 x {full_dims} "
+          f"({full_bytes / 1e6:.2f} MB)\n")
+    print(f"{'dims':>5}  {'format':<17} {'index':>9} {'smaller':>8} {'recall':>7} {'p50 ms':>7}")
+
+    client = chromadb.EphemeralClient()
+    for dims in args.dims:
+        if dims > full_dims:
+            continue
+        short_vectors = truncate(vectors, dims)
+        short_queries = truncate(queries, dims)
+
+        # Rescoring reads full-precision vectors back from a collection
+        name = f"bench-{dims}"
+        collection = client.get_or_create_collection(name, metadata={'hnsw:space': 'cosine'})
+        for start in range(0, len(ids), 1000):
+            collection.upsert(ids=ids[start:start + 1000],
+                              embeddings=short_vectors[start:start + 1000].tolist())
+
+        for label, quantization, rescore in FORMATS:
+            retriever = NumpyRetriever(ids, short_vectors, empty, metas, quantization=quantization,
+                                       rescore_collection=collection if rescore else None)
+            timings = []
+            found = []
+            for q in short_queries:
+                start = time.perf_counter()
+                found.append(retriever.query([q], args.k, include=())['ids'][0])
+                timings.append((time.perf_counter() - start) * 1000)
+            recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(exact, found)])
+            size = retriever.index_nbytes()
+            print(f"{dims:>5}  {label:<17} {size / 1e3:>7.0f}KB {full_bytes / size:>7.1f}x "
+                  f"{recall:>7.3f} {np.median(timings):>7.3f}")
+        client.delete_collection(name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Run from the repo root: python benchmarks/bench_retrievers.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# A fix for working with ChromaDB on Streamlit Community Cloud
+__import__('pysqlite3')
+sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+import chromadb
+
+from utils.retrievers import ChromaRetriever, NumpyRetriever
+
+# ===================================================================
+# Query latency: Chroma (SQLite + HNSW) vs in-process NumPy exact search
+# ===================================================================
+# By default builds a throwaway Chroma collection of random unit vectors
+# the size of our corpora. Pass --db-path/--collection to benchmark a real
+# prebuilt collection instead (queries are then perturbed stored vectors).
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def time_queries(label, fn, queries, k):
+    timings = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q, k)
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<22} p50 {statistics.median(timings):7.3f} ms   p99 {percentile(timings, 99):7.3f} ms")
+    return timings
+
+
+def synthetic_collection(path, n, dims, seed):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dims)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    client = chromadb.PersistentClient(path=path)
+    collection = client.create_collection('bench', metadata={'hnsw:space': 'cosine'})
+    for start in range(0, n, 1000):
+        end = min(n, start + 1000)
+        collection.add(
+            ids=[str(i) for i in range(start, end)],
+            embeddings=vectors[start:end].tolist(),
+            documents=[f"doc {i}" for i in range(start, end)],
+            metadatas=[{'i': i} for i in range(start, end)]
+        )
+    return collection
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Chroma vs NumPy retrieval latency")
+    parser.add_argument('--db-path', help="Existing ChromaDB directory (default: synthetic data)")
+    parser.add_argument('--collection', help="Collection name inside --db-path")
+    parser.add_argument('--n', type=int, default=1290, help="Synthetic corpus size")
+    parser.add_argument('--dims', type=int, default=1536, help="Synthetic vector size")
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--batch', type=int, default=8, help="Queries per batched NumPy search")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    if args.db_path:
+        collection = chromadb.PersistentClient(path=args.db_path).get_collection(args.collection)
+    else:
+        tmp_dir = tempfile.mkdtemp()
+        collection = synthetic_collection(tmp_dir, args.n, args.dims, seed=0)
+
+    try:
+        start = time.perf_counter()
+        numpy_retriever = NumpyRetriever.from_collection(collection)
+        load_ms = (time.perf_counter() - start) * 1000
+        chroma_retriever = ChromaRetriever(collection)
+        print(f"{numpy_retriever.count()} vectors x {numpy_retriever.matrix.shape[1]} dims "
+              f"({numpy_retriever.matrix.nbytes / 1e6:.1f} MB float32, loaded in {load_ms:.0f} ms)")
+
+        # Queries near stored vectors, like real questions near real documents
+        rng = np.random.default_rng(1)
+        base = numpy_retriever.matrix[rng.integers(0, numpy_retriever.count(), args.queries)]
+        queries = (base + 0.5 * rng.standard_normal(base.shape).astype(np.float32) / np.sqrt(base.shape[1])).tolist()
+
+        # Warm both paths (HNSW segment load, BLAS init)
+        chroma_retriever.query([queries[0]], args.k)
+        numpy_retriever.query([queries[0]], args.k)
+
+        time_queries('chroma', lambda q, k: chroma_retriever.query([q], k), queries, args.k)
+        time_queries('numpy', lambda q, k: numpy_retriever.query([q], k), queries, args.k)
+
+        batches = [queries[i:i + args.batch] for i in range(0, len(queries), args.batch)]
+        timings = time_queries(f'numpy batched (x{args.batch})',
+                               lambda b, k: numpy_retriever.query(b, k), batches, args.k)
+        print(f"{'':<22} = {statistics.median(timings) / args.batch:.3f} ms per query")
+
+        # How often the approximate HNSW top-k matches the exact top-k
+        sample = queries[:100]
+        exact = numpy_retriever.query(sample, args.k, include=())['ids']
+        approx = chroma_retriever.query(sample, args.k, include=[])['ids']
+        overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(exact, approx)])
+        print(f"Chroma recall@{args.k} vs exact: {overlap:.3f}")
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
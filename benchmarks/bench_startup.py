@@ -0,0 +1,104 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+# Run from the repo root: python benchmarks/bench_startup.py
+ROOT = Path(__file__).resolve().parent.parent
+
+# ===================================================================
+# App cold start: time to first render and what gets imported
+# ===================================================================
+# Each run starts a fresh interpreter and renders streamlit_app.py's
+# default page once with Streamlit's AppTest (dummy secrets, no network
+# calls happen before the user types), timing from just before the script
+# runs to when the page is rendered. A separate `python -X importtime` run
+# of the same thing lists the slowest top-level imports.
+#
+# --eager imports every page module before rendering, which is what the
+# app did before pages were loaded lazily, for comparison.
+
+PAGE_MODULES = [
+    'Labs.Lab1', 'Labs.Lab2', 'Labs.Lab3', 'Labs.Lab4', 'Labs.Lab5', 'Labs.Lab6', 'Labs.Lab8',
+    'Labs.Lab9', 'HW.HW1', 'HW.HW2', 'HW.HW3', 'HW.HW4', 'HW.HW5', 'HW.HW7',
+]
+
+RENDER_SCRIPT = """
+import importlib, json, sys, time
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+
+at = AppTest.from_file({app!r}, default_timeout=120)
+at.secrets['OPENAI_API_KEY'] = 'sk-benchmark'
+at.secrets['ANTHROPIC_API_KEY'] = 'benchmark'
+at.secrets['OPENWEATHER_API_KEY'] = 'benchmark'
+start = time.perf_counter()
+for name in {eager_modules!r}:
+    importlib.import_module(name)
+at.run()
+elapsed = time.perf_counter() - start
+print(json.dumps({{'ms': elapsed * 1000, 'modules': len(sys.modules),
+                   'exception': bool(at.exception)}}))
+"""
+
+
+def render_script(eager):
+    return RENDER_SCRIPT.format(root=str(ROOT), app=str(ROOT / 'streamlit_app.py'),
+                                eager_modules=PAGE_MODULES if eager else [])
+
+
+def first_render(eager):
+    result = subprocess.run([sys.executable, '-c', render_script(eager)], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# Cumulative import time (ms) of each top-level import made while rendering
+def import_times(eager):
+    # Everything AppTest itself needs is imported before the timed part;
+    # leave those out so only the app's own imports are listed
+    baseline = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import streamlit.testing.v1'],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stderr
+    seen = {line.split('|')[2].strip() for line in baseline.splitlines() if line.startswith('import time:')}
+
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', render_script(eager)],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # Only top-level entries (no indentation) that AppTest didn't bring in
+        if name.startswith('  ') or name.strip() in seen:
+            continue
+        times.append((int(cumulative) / 1000, name.strip()))
+    return sorted(times, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app cold start")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=12, help="Slowest imports to list")
+    parser.add_argument('--eager', action='store_true', help="Import every page first (old behaviour)")
+    args = parser.parse_args()
+
+    runs = [first_render(args.eager) for _ in range(args.runs)]
+    if any(run['exception'] for run in runs):
+        print("WARNING: the default page raised an exception while rendering")
+    timings = [run['ms'] for run in runs]
+    mode = 'eager' if args.eager else 'lazy'
+    print(f"Time to first render ({mode}, {args.runs} cold starts): "
+          f"median {statistics.median(timings):.0f} ms, min {min(timings):.0f} ms, "
+          f"{runs[0]['modules']} modules loaded")
+
+    print("\nSlowest top-level imports while rendering:")
+    for ms, name in import_times(args.eager)[:args.top]:
+        print(f"  {ms:8.1f} ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,73 +1,457 @@
+import argparse
 import csv
+import hashlib
+import json
 import sys
-from openai import OpenAI
 import os
+import threading
 
 # A fix for working with ChromaDB on Streamlit Community Cloud
 __import__('pysqlite3')
 sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 import chromadb
+from openai import OpenAI
 
+from utils.bm25 import BM25_INDEX_NAME, BM25Index
+from utils.dedup import Deduplicator
+from utils.async_ingest import DEFAULT_CONCURRENCY, ingest_batches
+from utils.chunker import ChunkPolicy, chunk_text, count_tokens
+from utils.embedding_cache import EMBEDDING_MODEL, embed_texts, get_default_cache
+from utils.manifest import source_hashes, write_manifest
+from utils.retrievers import check_collection_dimensions
+from utils.risk_index import (DEFAULT_RECENCY_HALF_LIFE, DEFAULT_RECENCY_WEIGHT, RISK_INDEX_NAME,
+                              RISK_QUERY, rank_by_risk, save_risk_index)
 
-# Create OpenAI client using environment variable
-client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
 
-# A function that adds a single article to the ChromaDB collection
-def add_to_collection(collection, text, doc_id, company, date, url):
-    response = client.embeddings.create(
-        input=text,
-        model='text-embedding-3-small'
-    )
-    embedding = response.data[0].embedding
+# Batch defaults. The embeddings endpoint accepts up to 2048 inputs per
+# request, and we keep well under its per-request token limit too.
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_BATCH_TOKENS = 100_000
 
-    collection.add(
-        documents=[text],
-        ids=[doc_id],
-        embeddings=[embedding],
-        metadatas=[{"company": company, "date": date, "url": url}]
-    )
+# Chroma rejects a single write larger than the client's max batch size
+# (5461 for the default SQLite build); main passes the real limit in
+DEFAULT_MAX_WRITE_BATCH = 5000
+
+# News rows are short, so almost every article is a single chunk; only
+# unusually long ones get split
+NEWS_CHUNK_POLICY = ChunkPolicy(max_tokens=800, overlap_tokens=100)
+
+# Group rows into batches, closing a batch when it reaches batch_size rows
+# or when adding the next row would go over the max_tokens budget
+def make_batches(records, batch_size=DEFAULT_BATCH_SIZE, max_tokens=DEFAULT_MAX_BATCH_TOKENS):
+    batch = []
+    batch_tokens = 0
+    for record in records:
+        tokens = count_tokens(record['text'])
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_tokens):
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(record)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+# Content-addressed IDs: the same article always gets the same ID no matter
+# where it sits in the CSV. The URL part keeps articles apart, the document
+# hash part changes whenever the article text changes.
+def document_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def make_doc_id(url, doc_hash):
+    url_hash = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return f"{url_hash[:16]}-{doc_hash[:16]}"
+
+# Turn a CSV row into the text, ID and metadata we store in ChromaDB.
+# Articles stored before `day` existed pick it up as a metadata-only update.
+def row_to_record(row):
+    text = row['Document'].strip()
+    if not text:
+        return None
+    url = row['URL'].strip()
+    doc_hash = document_hash(text)
+    metadata = {
+        'company': row['company_name'].strip(),
+        'date': row['Date'].strip(),
+        'url': url,
+        'doc_hash': doc_hash
+    }
+    # Integer day number so date ranges can be filtered with $gte/$lte
+    day = (row.get('days_since_2000') or '').strip()
+    if day.isdigit():
+        metadata['day'] = int(day)
+    return {
+        'id': make_doc_id(url, doc_hash),
+        'text': text,
+        'metadata': metadata
+    }
+
+# Consecutive slices of at most `size` items
+def in_slices(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+# Short digest of an article's metadata, so the sync can tell which stored
+# articles need a metadata update without keeping their metadata around
+def metadata_fingerprint(metadata):
+    return hashlib.sha256(json.dumps(metadata, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+# Fingerprint of the metadata already stored, by ID, read a page at a time
+# (no documents or embeddings fetched)
+def stored_fingerprints(collection, page_size=DEFAULT_MAX_WRITE_BATCH):
+    fingerprints = {}
+    for offset in range(0, collection.count(), page_size):
+        page = collection.get(include=['metadatas'], limit=page_size, offset=offset)
+        for doc_id, metadata in zip(page['ids'], page['metadatas']):
+            fingerprints[doc_id] = metadata_fingerprint(metadata or {})
+    return fingerprints
 
-# Read the CSV and load all articles into ChromaDB
-def load_csv_to_collection(csv_path, collection):
-    rows = []
+# Stream the CSV one row at a time as (offset, record) pairs, so only the
+# batch being built is ever held in memory (see load_csv_to_collection for
+# what is kept per article). Rows before `start` are skipped.
+def stream_csv_records(csv_path, start=0):
     with open(csv_path, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            rows.append(row)
+        for offset, row in enumerate(csv.DictReader(f)):
+            if offset < start:
+                continue
+            record = row_to_record(row)
+            if record:
+                record['offset'] = offset
+                yield record
 
-    print(f"Loaded {len(rows)} articles from CSV")
+# First pass: find exact and near-duplicate articles before anything is
+# embedded. The first article of each group is kept, and the companies and
+# URLs of the others are collected for its metadata so nothing is lost.
+# Only hashes, signatures and these small lists are kept, never the rows.
+def scan_duplicates(records, threshold=0.8):
+    dedup = Deduplicator(threshold=threshold)
+    groups = {}  # representative ID -> offset, company, url and what it absorbed
 
-    for i, row in enumerate(rows):
-        text = row['Document'].strip()
-        if not text:
+    for record in records:
+        meta = record['metadata']
+        rep_id = dedup.add(record['id'], record['text'])
+        if rep_id is None:
+            groups[record['id']] = {
+                'offset': record['offset'],
+                'company': meta['company'],
+                'url': meta['url'],
+                'companies': [],
+                'urls': [],
+                'count': 0
+            }
             continue
 
-        add_to_collection(
-            collection=collection,
-            text=text,
-            doc_id=str(i),
-            company=row['company_name'].strip(),
-            date=row['Date'].strip(),
-            url=row['URL'].strip()
-        )
+        group = groups[rep_id]
+        group['count'] += 1
+        if meta['company'] != group['company'] and meta['company'] not in group['companies']:
+            group['companies'].append(meta['company'])
+        if meta['url'] != group['url'] and meta['url'] not in group['urls']:
+            group['urls'].append(meta['url'])
+
+    return groups
+
+# Keep only the representative row of each duplicate group and attach the
+# companies and URLs it stands in for. `companies` lists the article's own
+# company and the absorbed ones, so filtering on a company also finds the
+# stories that were folded into another company's article.
+def collapse_duplicates(records, groups):
+    for record in records:
+        group = groups.get(record['id'])
+        if group is None or group['offset'] != record['offset']:
+            continue
+        # Every company the story is about, for HW7's company filter
+        record['metadata']['companies'] = [record['metadata']['company'], *group['companies']]
+        record['metadata']['duplicate_companies'] = ' | '.join(group['companies'])
+        record['metadata']['duplicate_urls'] = ' | '.join(group['urls'])
+        record['metadata']['duplicate_count'] = group['count']
+        yield record
+
+# Split each article with the shared chunker. A single-chunk article keeps
+# its plain ID; longer ones get "#c<n>" suffixes. Chunk offsets within the
+# article are stored in metadata.
+def split_into_chunks(records, policy=NEWS_CHUNK_POLICY):
+    for record in records:
+        chunks = chunk_text(record['text'], policy)
+        for chunk in chunks:
+            suffix = f"#c{chunk['index']}" if len(chunks) > 1 else ""
+            yield {
+                'id': record['id'] + suffix,
+                'text': chunk['text'],
+                'offset': record['offset'],
+                'metadata': {
+                    **record['metadata'],
+                    'chunk_index': chunk['index'],
+                    'chunk_start': chunk['start'],
+                    'chunk_end': chunk['end'],
+                },
+            }
+
+# Tracks which CSV rows are safely stored so an interrupted run can resume.
+# Batches finish out of order when embedded concurrently, so the saved
+# offset only moves past a batch once every batch before it is done too.
+# The saved offset is the last row of the last finished batch (not the row
+# after it), because that row's later chunks may be in the next batch;
+# re-reading one row on resume is harmless since writes are upserts.
+class Checkpoint:
+    def __init__(self, path, csv_path):
+        self.path = path
+        self.csv_path = os.path.abspath(csv_path)
+        self.pending = []  # [batch object id, last offset, done] per batch, in stream order
+        self.offset = 0
+        # Batches are produced in a worker thread and finished on the event loop
+        self._lock = threading.Lock()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved.get('csv') != self.csv_path or saved.get('csv_size') != os.path.getsize(self.csv_path):
+            print("Checkpoint is for a different CSV, starting from the beginning")
+            return 0
+        self.offset = saved['offset']
+        return self.offset
+
+    def track(self, batches):
+        for batch in batches:
+            with self._lock:
+                self.pending.append([id(batch), batch[-1]['offset'], False])
+            yield batch
+
+    def batch_done(self, batch):
+        with self._lock:
+            for entry in self.pending:
+                if entry[0] == id(batch):
+                    entry[2] = True
+            advanced = False
+            while self.pending and self.pending[0][2]:
+                self.offset = self.pending.pop(0)[1]
+                advanced = True
+            if advanced:
+                self.save()
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'csv': self.csv_path,
+                'csv_size': os.path.getsize(self.csv_path),
+                'offset': self.offset
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+# Stream the CSV and sync the collection with it in batches.
+# Duplicates are collapsed first, then only articles whose ID is not in
+# the collection yet are embedded, and articles that are no longer in the
+# CSV are deleted, so a daily refresh costs time in proportion to what
+# changed. With resume=True, rows before the last checkpoint are skipped.
+#
+# Article text and embeddings are only ever held one batch at a time, but
+# a few small things are kept for every article: its dedup signature and
+# group entry, its wanted chunk IDs, and a 16-character fingerprint of
+# what is stored for it. Memory therefore still grows with the corpus,
+# by a few kilobytes per article (about 3 KB on news.csv) rather than by
+# its text and embedding.
+def load_csv_to_collection(csv_path, collection, batch_size=DEFAULT_BATCH_SIZE,
+                           max_tokens=DEFAULT_MAX_BATCH_TOKENS, dedup_threshold=0.8,
+                           workers=DEFAULT_CONCURRENCY, checkpoint_path=None, resume=False,
+                           dimensions=None, max_write_batch=DEFAULT_MAX_WRITE_BATCH):
+    checkpoint = Checkpoint(checkpoint_path or csv_path + '.checkpoint.json', csv_path)
+    start = checkpoint.load() if resume else 0
+    if not resume:
+        checkpoint.clear()
 
-        if (i + 1) % 100 == 0:
-            print(f"  Inserted {i + 1}/{len(rows)}")
+    # Pass 1 (no API calls): duplicate groups and the set of IDs we want
+    groups = scan_duplicates(stream_csv_records(csv_path), dedup_threshold)
+    total = sum(g['count'] + 1 for g in groups.values())
+    print(f"Scanned {total} articles: {total - len(groups)} duplicates collapsed, {len(groups)} unique")
 
-    print(f"Done! {collection.count()} articles in the database")
+    # Every chunk ID the CSV splits into under the current chunk policy
+    # (tokenizing only, no API calls). Stored IDs outside it are stale:
+    # articles that left the feed, and chunks of a split that changed
+    # (e.g. a single-chunk article that now has #c0/#c1, or vice versa).
+    wanted_ids = {
+        record['id']
+        for record in split_into_chunks(collapse_duplicates(stream_csv_records(csv_path), groups))
+    }
 
-# Set up ChromaDB and run
-chroma_client = chromadb.PersistentClient(path='./news_chroma_db')
+    current = stored_fingerprints(collection, max_write_batch)
+    stale_ids = set(current) - wanted_ids
+    for ids in in_slices(sorted(stale_ids), max_write_batch):
+        collection.delete(ids=ids)
+    print(f"{len(stale_ids)} removed")
 
-try:
-    chroma_client.delete_collection('news_articles')
-    print("Deleted old collection")
-except:
-    pass
+    if start:
+        print(f"Resuming from row {start}")
 
-collection = chroma_client.create_collection(
-    name='news_articles',
-    metadata={'hnsw:space': 'cosine'}
-)
+    # Pass 2: stream the rows again. New articles are embedded; articles we
+    # already have whose metadata changed (e.g. a backfilled field on every
+    # article) only need a metadata update. Updates are written a slice at
+    # a time as they are found, so they never pile up in memory.
+    changed = {}  # ID -> new metadata, not written yet
+    updated = 0
 
-load_csv_to_collection('news.csv', collection)
\ No newline at end of file
+    def write_updates():
+        nonlocal updated
+        if changed:
+            collection.update(ids=list(changed), metadatas=list(changed.values()))
+            updated += len(changed)
+            changed.clear()
+
+    def needs_embedding(records):
+        for record in records:
+            stored = current.get(record['id'])
+            if stored is None:
+                yield record
+            elif stored != metadata_fingerprint(record['metadata']):
+                changed[record['id']] = record['metadata']
+                if len(changed) >= max_write_batch:
+                    write_updates()
+
+    def report(stats):
+        rate = stats['rows'] / stats['elapsed'] if stats['elapsed'] else 0.0
+        print(f"  Inserted {stats['rows']} ({rate:.1f} rows/sec)")
+
+    records = needs_embedding(split_into_chunks(
+        collapse_duplicates(stream_csv_records(csv_path, start), groups)
+    ))
+
+    # Embed batches concurrently; rows that keep failing go to dead_letter.jsonl
+    stats = ingest_batches(
+        checkpoint.track(make_batches(records, batch_size, max_tokens)),
+        collection,
+        api_key=os.environ["OPENAI_API_KEY"],
+        model=EMBEDDING_MODEL,
+        dimensions=dimensions,
+        concurrency=workers,
+        on_progress=report,
+        on_batch=checkpoint.batch_done
+    )
+
+    write_updates()
+
+    rate = stats['rows'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    print(f"Done! {collection.count()} articles in the database "
+          f"({stats['rows']} embedded, {updated} metadata updates, "
+          f"{stats['elapsed']:.1f}s, {rate:.1f} rows/sec, {stats['requests']} requests, "
+          f"{stats['retries']} retries)")
+    if stats['failed']:
+        print(f"WARNING: {stats['failed']} articles failed and were written to dead_letter.jsonl")
+
+    # A finished run needs no checkpoint
+    checkpoint.clear()
+    stats = get_default_cache().stats()
+    print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses, "
+          f"{stats['entries']} entries")
+
+# Keyword index for hybrid search in HW7. Company names are weighted up so
+# an article tagged with a company outranks one that only mentions it.
+BM25_FIELD_WEIGHTS = {'company': 3.0, 'document': 1.0}
+
+# Rebuild the BM25 index from what is actually stored, so it always
+# matches the collection's IDs (after dedup, chunking and deletions)
+def build_bm25_index(collection, path):
+    stored = collection.get(include=['documents', 'metadatas'])
+    fields = [
+        {
+            'company': f"{meta.get('company', '')} {meta.get('duplicate_companies', '')}",
+            'document': doc,
+        }
+        for doc, meta in zip(stored['documents'], stored['metadatas'])
+    ]
+    index = BM25Index.build(stored['ids'], fields, BM25_FIELD_WEIGHTS)
+    index.save(path)
+    print(f"BM25 index: {len(index.ids)} documents, {len(index.postings)} terms -> {path}")
+
+# Score every stored article against the fixed risk query and save the
+# ranking, so HW7's find_interesting_news is a lookup instead of a search
+def build_risk_index(collection, path, recency_weight=DEFAULT_RECENCY_WEIGHT,
+                     half_life=DEFAULT_RECENCY_HALF_LIFE, dimensions=None):
+    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    query_embedding = embed_texts(client, [RISK_QUERY], model=EMBEDDING_MODEL, dimensions=dimensions)[0]
+    stored = collection.get(include=['embeddings', 'metadatas'])
+    ranked = rank_by_risk(stored['ids'], stored['embeddings'], stored['metadatas'],
+                          query_embedding, recency_weight, half_life)
+    save_risk_index(path, ranked, query=RISK_QUERY, model=EMBEDDING_MODEL,
+                    recency_weight=recency_weight, half_life=half_life)
+    print(f"Risk index: {len(ranked)} articles ranked -> {path}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the news ChromaDB collection from news.csv")
+    parser.add_argument('--csv', default='news.csv', help="Path to the news CSV file")
+    parser.add_argument('--db-path', default='./news_chroma_db', help="ChromaDB persistence directory")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Maximum rows per embedding request / bulk insert")
+    parser.add_argument('--max-batch-tokens', type=int, default=DEFAULT_MAX_BATCH_TOKENS,
+                        help="Maximum estimated tokens per embedding request")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Delete the collection and re-embed everything instead of syncing")
+    parser.add_argument('--workers', type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum embedding requests in flight at once")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue an interrupted run from its last checkpoint")
+    parser.add_argument('--checkpoint', default=None,
+                        help="Checkpoint file (default: <csv>.checkpoint.json)")
+    parser.add_argument('--dedup-threshold', type=float, default=0.8,
+                        help="Estimated Jaccard similarity above which articles are merged")
+    parser.add_argument('--dimensions', type=int, default=None,
+                        help="Shortened embedding size, e.g. 256 or 512 (default: the model's full size)")
+    parser.add_argument('--recency-weight', type=float, default=DEFAULT_RECENCY_WEIGHT,
+                        help="How much recency adds to an article's risk score (0 to ignore dates)")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    # Set up ChromaDB and run
+    chroma_client = chromadb.PersistentClient(path=args.db_path)
+
+    # A resumed rebuild must keep what the interrupted run already stored
+    if args.rebuild and not args.resume:
+        try:
+            chroma_client.delete_collection('news_articles')
+            print("Deleted old collection")
+        except:
+            pass
+
+    # Changing --dimensions means re-embedding everything
+    problem = check_collection_dimensions(chroma_client, 'news_articles', args.dimensions)
+    if problem:
+        print(problem)
+        sys.exit(1)
+
+    collection_metadata = {'hnsw:space': 'cosine'}
+    if args.dimensions:
+        collection_metadata['embedding_dimensions'] = args.dimensions
+    collection = chroma_client.get_or_create_collection(
+        name='news_articles',
+        metadata=collection_metadata
+    )
+
+    # Hash the source before building so the manifest describes exactly
+    # what was read
+    sources = source_hashes([args.csv])
+    load_csv_to_collection(args.csv, collection, args.batch_size, args.max_batch_tokens,
+                           args.dedup_threshold, args.workers, args.checkpoint, args.resume,
+                           args.dimensions, chroma_client.get_max_batch_size())
+    build_bm25_index(collection, os.path.join(args.db_path, BM25_INDEX_NAME))
+    build_risk_index(collection, os.path.join(args.db_path, RISK_INDEX_NAME), args.recency_weight,
+                     dimensions=args.dimensions)
+
+    # A new build_id tells the app to reopen the collection and drop
+    # answers cached against the old one
+    write_manifest(
+        args.db_path,
+        sources,
+        collection='news_articles',
+        model=EMBEDDING_MODEL,
+        dimensions=args.dimensions,
+        chunk_count=collection.count()
+    )
+    print(f"Wrote {args.db_path}/manifest.json")
@@ -0,0 +1,118 @@
+import argparse
+import os
+import sys
+from dataclasses import asdict
+
+# A fix for working with ChromaDB on Streamlit Community Cloud
+__import__('pysqlite3')
+sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+import chromadb
+
+from utils.async_ingest import DEFAULT_CONCURRENCY, ingest_batches
+from utils.embedding_cache import EMBEDDING_MODEL, get_default_cache
+from utils.manifest import source_hashes, write_manifest
+from utils.org_pipeline import (ORG_CHUNK_POLICY, ORG_COLLECTION_NAME, ORG_DB_PATH,
+                                ORG_SOURCE_FOLDER, iter_org_batches, list_org_files)
+from utils.retrievers import check_collection_dimensions
+
+# Offline build for the student org vector DB used by HW4 and HW5.
+# Run this ahead of time instead of making the first page visitor wait:
+#   python build_orgs_db.py
+# It parses su_orgs/ in parallel, embeds the chunks concurrently (through
+# the embedding cache), removes chunks whose file is gone, and writes
+# ChromaDB_for_HW4/manifest.json that the pages check before opening it.
+
+
+def build_collection(folder_path, collection, workers=DEFAULT_CONCURRENCY, parse_workers=None,
+                     dimensions=None):
+    wanted_ids = set()
+
+    def remember(batch):
+        wanted_ids.update(record['id'] for record in batch)
+
+    def report(stats):
+        rate = stats['rows'] / stats['elapsed'] if stats['elapsed'] else 0.0
+        print(f"  Inserted {stats['rows']} chunks ({rate:.1f} chunks/sec)")
+
+    stats = ingest_batches(
+        iter_org_batches(folder_path, max_workers=parse_workers),
+        collection,
+        api_key=os.environ["OPENAI_API_KEY"],
+        model=EMBEDDING_MODEL,
+        dimensions=dimensions,
+        concurrency=workers,
+        on_progress=report,
+        on_batch=remember
+    )
+
+    # Chunks from files that no longer exist
+    stale_ids = set(collection.get(include=[])['ids']) - wanted_ids
+    if stale_ids:
+        collection.delete(ids=sorted(stale_ids))
+
+    print(f"Done! {collection.count()} chunks in the database "
+          f"({stats['elapsed']:.1f}s, {stats['requests']} requests, {len(stale_ids)} removed)")
+    if stats['failed']:
+        print(f"WARNING: {stats['failed']} chunks failed and were written to dead_letter.jsonl")
+    return stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the student org ChromaDB collection from su_orgs/")
+    parser.add_argument('--folder', default=ORG_SOURCE_FOLDER, help="Folder of org HTML pages")
+    parser.add_argument('--db-path', default=ORG_DB_PATH, help="ChromaDB persistence directory")
+    parser.add_argument('--workers', type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum embedding requests in flight at once")
+    parser.add_argument('--parse-workers', type=int, default=None,
+                        help="Worker processes for HTML parsing (default: one per core)")
+    parser.add_argument('--dimensions', type=int, default=None,
+                        help="Shortened embedding size, e.g. 256 or 512 (default: the model's full size)")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Delete the collection before building")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    chroma_client = chromadb.PersistentClient(path=args.db_path)
+
+    if args.rebuild:
+        try:
+            chroma_client.delete_collection(ORG_COLLECTION_NAME)
+            print("Deleted old collection")
+        except:
+            pass
+
+    # Changing --dimensions means re-embedding everything
+    problem = check_collection_dimensions(chroma_client, ORG_COLLECTION_NAME, args.dimensions)
+    if problem:
+        print(problem)
+        sys.exit(1)
+
+    collection = chroma_client.get_or_create_collection(
+        ORG_COLLECTION_NAME,
+        metadata={'embedding_dimensions': args.dimensions} if args.dimensions else None
+    )
+
+    # Hash the sources before building so the manifest describes exactly
+    # what was read
+    sources = source_hashes(list_org_files(args.folder))
+    stats = build_collection(args.folder, collection, args.workers, args.parse_workers, args.dimensions)
+
+    if stats['failed']:
+        print("Not writing a manifest because some chunks failed; fix them and run again.")
+        sys.exit(1)
+
+    write_manifest(
+        args.db_path,
+        sources,
+        collection=ORG_COLLECTION_NAME,
+        model=EMBEDDING_MODEL,
+        dimensions=args.dimensions,
+        chunk_policy=asdict(ORG_CHUNK_POLICY),
+        chunk_count=collection.count()
+    )
+    cache_stats = get_default_cache().stats()
+    print(f"Wrote {args.db_path}/manifest.json "
+          f"(embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses)")
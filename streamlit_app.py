@@ -1,39 +1,71 @@
+import importlib
+import threading
+
 import streamlit as st
-import Labs.Lab1 as Lab1
-import Labs.Lab2 as Lab2
-import Labs.Lab3 as Lab3
-import Labs.Lab4 as Lab4
-import Labs.Lab5 as Lab5
-import Labs.Lab6 as Lab6
-import Labs.Lab8 as Lab8
-import Labs.Lab9 as Lab9
-import HW.HW1 as HW1
-import HW.HW2 as HW2
-import HW.HW3 as HW3
-import HW.HW4 as HW4
-import HW.HW5 as HW5
-import HW.HW7 as HW7
 
-# Set up the navigation with separate sections
-pg = st.navigation({
+# ===================================================================
+# Lazy page registry
+# ===================================================================
+# Each page is registered by module and function name and only imported
+# when it is opened, so starting the app doesn't pull in chromadb,
+# anthropic, PyMuPDF, bs4, etc. for pages nobody has visited yet.
+# url_path keeps each page's URL what it was when the page functions
+# were passed to st.Page directly.
+
+# (module, page function, title, icon)
+PAGES = {
     "Labs": [
-        st.Page(Lab9.lab9, title="Long term Memory Boy", default=True),
-        st.Page(Lab8.lab8, title="Lab 8 - Image Captioning Bot 📷"),
-        st.Page(Lab6.lab6, title="Lab 6 - Responses AI", icon="👾"),
-        st.Page(Lab5.lab5, title="Lab 5 - Weather Chatbot", icon="🌤️"),
-        st.Page(Lab4.lab4, title="Lab 4 - Chatbot using RAG", icon="🔍"),
-        st.Page(Lab3.lab3, title="Lab 3 - Chatbot", icon="🤖"),
-        st.Page(Lab2.lab2, title="Lab 2 - Document Summarizer", icon="📄"),
-        st.Page(Lab1.lab1, title="Lab 1", icon="🔬"),
+        ("Labs.Lab9", "lab9", "Long term Memory Boy", None),
+        ("Labs.Lab8", "lab8", "Lab 8 - Image Captioning Bot 📷", None),
+        ("Labs.Lab6", "lab6", "Lab 6 - Responses AI", "👾"),
+        ("Labs.Lab5", "lab5", "Lab 5 - Weather Chatbot", "🌤️"),
+        ("Labs.Lab4", "lab4", "Lab 4 - Chatbot using RAG", "🔍"),
+        ("Labs.Lab3", "lab3", "Lab 3 - Chatbot", "🤖"),
+        ("Labs.Lab2", "lab2", "Lab 2 - Document Summarizer", "📄"),
+        ("Labs.Lab1", "lab1", "Lab 1", "🔬"),
     ],
     "Homework": [
-        st.Page(HW7.hw7, title="HW7 - News-Info Chatbot", icon="🗞️"),
-        st.Page(HW5.hw5, title="HW5 - Enhanced Chatbot", icon="🧠"),
-        st.Page(HW4.hw4, title="HW4 - iSchool Chatbot", icon="👨🏻‍🏫"),
-        st.Page(HW3.hw3, title="HW3 - URL Chatbot", icon="🤖"),
-        st.Page(HW2.hw2, title="HW 2 - URL Summarizer", icon="🌐"),
-        st.Page(HW1.hw1, title="HW 1", icon="📝"),
+        ("HW.HW7", "hw7", "HW7 - News-Info Chatbot", "🗞️"),
+        ("HW.HW5", "hw5", "HW5 - Enhanced Chatbot", "🧠"),
+        ("HW.HW4", "hw4", "HW4 - iSchool Chatbot", "👨🏻‍🏫"),
+        ("HW.HW3", "hw3", "HW3 - URL Chatbot", "🤖"),
+        ("HW.HW2", "hw2", "HW 2 - URL Summarizer", "🌐"),
+        ("HW.HW1", "hw1", "HW 1", "📝"),
+    ],
+}
+DEFAULT_PAGE = "lab9"
+
+
+def lazy_page(module_name, function_name):
+    def run():
+        getattr(importlib.import_module(module_name), function_name)()
+    return run
+
+
+# Open the prebuilt vector DBs in the background, once per server process,
+# so the first visitor to a RAG page doesn't wait for them. The import
+# happens on the background thread too, keeping it off the first render.
+@st.cache_resource(show_spinner=False)
+def start_warmup():
+    thread = threading.Thread(
+        target=lambda: importlib.import_module('utils.resources').warm_resources(),
+        name='start-warmup',
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+start_warmup()
+
+# Set up the navigation with separate sections
+pg = st.navigation({
+    section: [
+        st.Page(lazy_page(module, function), title=title, icon=icon,
+                url_path=function, default=function == DEFAULT_PAGE)
+        for module, function, title, icon in pages
     ]
+    for section, pages in PAGES.items()
 })
 
 # Run the selected page
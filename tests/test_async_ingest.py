@@ -0,0 +1,211 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import chromadb
+import pytest
+
+from utils import async_ingest, embedding_cache
+from utils.async_ingest import ingest_batches
+from utils.embedding_cache import EmbeddingCache
+
+# ===================================================================
+# ingest_batches against a fake embeddings server
+# ===================================================================
+# A local http.server stands in for the OpenAI embeddings endpoint and is
+# reached through base_url, so the real AsyncOpenAI client, its error
+# types and the response headers are all exercised. The server can answer
+# its first request with a 429 + Retry-After, rejects with a 400 any
+# request that contains the bad text, and can send rate-limit headers and
+# hold each request open for a while so concurrency shows up.
+
+RETRY_AFTER = 0.2  # seconds
+BAD_TEXT = 'this row is too long to embed'
+
+
+# Deterministic stand-in for a real embedding
+def fake_embedding(text):
+    return [float(len(text)), 1.0, 0.5]
+
+
+class FakeEmbeddingsServer(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeEmbeddingsHandler)
+        self.rate_limit_first = False
+        self.success_headers = {}
+        self.delay = 0.0  # seconds each request is held open
+        self.requests = []  # (time received, inputs) per request
+        self.concurrency = []  # requests in flight when each one arrived
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class FakeEmbeddingsHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        inputs = body['input']
+        with self.server.lock:
+            first = not self.server.requests
+            self.server.requests.append((time.monotonic(), inputs))
+            self.server.in_flight += 1
+            self.server.concurrency.append(self.server.in_flight)
+        try:
+            time.sleep(self.server.delay)
+            self._respond(body, inputs, first)
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+
+    def _respond(self, body, inputs, first):
+        if first and self.server.rate_limit_first:
+            self._reply(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}},
+                        {'Retry-After': str(RETRY_AFTER)})
+        elif BAD_TEXT in inputs:
+            self._reply(400, {'error': {'message': 'Input is too long', 'type': 'invalid_request_error'}})
+        else:
+            self._reply(200, {
+                'object': 'list',
+                'data': [{'object': 'embedding', 'index': i, 'embedding': fake_embedding(text)}
+                         for i, text in enumerate(inputs)],
+                'model': body['model'],
+                'usage': {'prompt_tokens': 0, 'total_tokens': 0},
+            }, self.server.success_headers)
+
+    def _reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = FakeEmbeddingsServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+# Keep the shared SQLite embedding cache out of the tests
+@pytest.fixture(autouse=True)
+def embedding_cache_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, '_default_cache', EmbeddingCache(str(tmp_path / 'cache.sqlite3')))
+
+
+@pytest.fixture
+def collection():
+    return chromadb.EphemeralClient().create_collection(f"ingest-{uuid.uuid4().hex}")
+
+
+def make_batch(prefix, texts):
+    return [{'id': f"{prefix}-{i}", 'text': text, 'metadata': {'n': i}} for i, text in enumerate(texts)]
+
+
+def ingest(server, collection, batches, tmp_path, on_batch=None, **kwargs):
+    return ingest_batches(batches, collection, api_key='test-key', base_url=server.base_url,
+                          dead_letter_path=str(tmp_path / 'dead_letter.jsonl'), on_batch=on_batch, **kwargs)
+
+
+def dead_letters(tmp_path):
+    path = tmp_path / 'dead_letter.jsonl'
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_rate_limit_is_retried_after_retry_after(server, collection, tmp_path):
+    server.rate_limit_first = True
+    batch = make_batch('a', ['alpha', 'beta', 'gamma'])
+
+    stats = ingest(server, collection, [batch], tmp_path)
+
+    assert stats['retries'] == 1
+    assert stats['rows'] == 3 and stats['failed'] == 0
+    (first_at, first_inputs), (second_at, second_inputs) = server.requests
+    assert second_inputs == first_inputs
+    assert second_at - first_at >= RETRY_AFTER
+    stored = collection.get(ids=[r['id'] for r in batch])
+    assert sorted(stored['ids']) == ['a-0', 'a-1', 'a-2']
+    assert dead_letters(tmp_path) == []
+
+
+def test_bad_request_isolates_the_bad_row(server, collection, tmp_path):
+    batches = [
+        make_batch('a', ['one', 'two', BAD_TEXT, 'four']),
+        make_batch('b', ['five', 'six', 'seven']),
+    ]
+    finished = []
+
+    stats = ingest(server, collection, batches, tmp_path, on_batch=finished.append)
+
+    # Only the bad row is dead-lettered; every other row is stored
+    assert [letter['id'] for letter in dead_letters(tmp_path)] == ['a-2']
+    assert 'BadRequestError' in dead_letters(tmp_path)[0]['error']
+    good = [r for batch in batches for r in batch if r['text'] != BAD_TEXT]
+    stored = collection.get(include=['embeddings', 'documents'])
+    assert sorted(stored['ids']) == sorted(r['id'] for r in good)
+    for doc, vector in zip(stored['documents'], stored['embeddings']):
+        assert list(vector) == pytest.approx(fake_embedding(doc))
+    assert stats['rows'] == len(good) and stats['failed'] == 1
+
+    # on_batch reports each original batch once, splits and all
+    assert len(finished) == len(batches)
+    assert sorted(batch[0]['id'] for batch in finished) == ['a-0', 'b-0']
+
+
+# Records every limit it is set to, and the in-flight count at each acquire
+class RecordingLimiter(async_ingest.AdaptiveLimiter):
+    instances = []
+
+    def __init__(self, max_concurrency):
+        super().__init__(max_concurrency)
+        self.limits = [self.limit]
+        self.acquired = []  # (in flight, limit) right after each acquire
+        RecordingLimiter.instances.append(self)
+
+    async def acquire(self):
+        await super().acquire()
+        self.acquired.append((self.in_flight, self.limit))
+
+    async def _set_limit(self, limit):
+        await super()._set_limit(limit)
+        self.limits.append(self.limit)
+
+
+def test_low_rate_limit_headroom_lowers_concurrency(server, collection, tmp_path, monkeypatch):
+    monkeypatch.setattr(async_ingest, 'AdaptiveLimiter', RecordingLimiter)
+    RecordingLimiter.instances.clear()
+    # 5% of the request budget left on every response
+    server.success_headers = {
+        'x-ratelimit-limit-requests': '100',
+        'x-ratelimit-remaining-requests': '5',
+    }
+    server.delay = 0.1
+    batches = [make_batch(f"b{i}", [f"text {i}"]) for i in range(12)]
+
+    stats = ingest(server, collection, batches, tmp_path, concurrency=4)
+
+    assert stats['rows'] == 12 and stats['failed'] == 0
+    limiter, = RecordingLimiter.instances
+    # The limit halves on low headroom, down to one request at a time
+    assert limiter.limits[0] == 4 and min(limiter.limits) == 1
+    assert all(in_flight <= limit for in_flight, limit in limiter.acquired)
+    # The first wave ran concurrently; once the limit dropped, the server
+    # saw one request at a time
+    assert max(server.concurrency[:4]) > 1
+    assert set(server.concurrency[-6:]) == {1}
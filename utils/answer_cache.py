@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.tool_executor import parse_tool_call
+from utils.vectors import normalize_rows
+
+# ===================================================================
+# Semantic answer cache for the RAG chatbots
+# ===================================================================
+# Near-identical questions ("what clubs are there for robotics",
+# "robotics club?") retrieve the same documents and get the same answer,
+# yet each one pays for a full completion. This cache stores answers and
+# hands one back when a new question
+#   - is in the same namespace (one per page) and uses the same model,
+#   - was asked against the same collection version (manifest build_id),
+#   - follows the same earlier conversation (hash of the prior messages),
+#   - retrieved exactly the same set of document IDs, and
+#   - has a query embedding with cosine similarity >= the threshold.
+# The doc-ID set keeps two similar-sounding questions that pull different
+# documents apart.
+#
+# Pages whose context comes from tools (HW5, HW7) only know what was
+# retrieved once the tools have run, so ToolAnswerCache looks the answer
+# up after the first tool round, keyed on every call's name and arguments
+# (filters, counts) and on the text each one returned, which lists the
+# documents it found. A hit skips the rest of the turn; "top 3" and
+# "top 5", or the same question for another client or date range, never
+# share an answer. When a collection is rebuilt, its build_id changes, so
+# entries for the old version stop matching and are dropped on the next
+# lookup in that namespace.
+#
+# Entries expire after `ttl` seconds, and the least recently used one is
+# evicted past `max_entries`. Like the query embedding cache it lives at
+# module level and is shared by every session in the process.
+#
+# RAG_ANSWER_CACHE=0 turns it off; RAG_ANSWER_CACHE_THRESHOLD sets the
+# similarity needed for a hit.
+
+ANSWER_CACHE_ENABLED = os.environ.get('RAG_ANSWER_CACHE', '1') != '0'
+DEFAULT_ANSWER_CACHE_THRESHOLD = float(os.environ.get('RAG_ANSWER_CACHE_THRESHOLD', 0.95))
+DEFAULT_ANSWER_CACHE_SIZE = 1024
+DEFAULT_ANSWER_CACHE_TTL = 6 * 60 * 60  # seconds
+
+
+# Stable key for the conversation before the current question
+def history_key(messages):
+    history = [(m['role'], m['content']) for m in messages]
+    return hashlib.sha256(json.dumps(history).encode('utf-8')).hexdigest()
+
+
+# Stable key for one round of tool calls: each call's name and parsed
+# arguments with the result it returned, independent of call order
+def tool_round_key(tool_calls, tool_messages):
+    entries = []
+    for call, message in zip(tool_calls, tool_messages):
+        _, name, args = parse_tool_call(call)
+        entries.append(json.dumps([name, args, message['content']], sort_keys=True))
+    return hashlib.sha256(json.dumps(sorted(entries)).encode('utf-8')).hexdigest()
+
+
+class SemanticAnswerCache:
+    def __init__(self, max_entries=DEFAULT_ANSWER_CACHE_SIZE, ttl=DEFAULT_ANSWER_CACHE_TTL,
+                 threshold=DEFAULT_ANSWER_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidated = 0
+        # entry id -> (namespace, exact key, unit embedding, answer, stored_at),
+        # oldest use first
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    # Everything but the embedding has to match exactly
+    @staticmethod
+    def _key(model, version, doc_ids, context):
+        return model, version, frozenset(doc_ids), context
+
+    # Drop expired entries, and entries for another version of this
+    # namespace's collection. Called with the lock held.
+    def _prune(self, namespace, version):
+        now = time.monotonic()
+        for entry_id, (entry_namespace, key, _, _, stored_at) in list(self._entries.items()):
+            if now - stored_at > self.ttl:
+                del self._entries[entry_id]
+                self.expired += 1
+            elif entry_namespace == namespace and key[1] != version:
+                del self._entries[entry_id]
+                self.invalidated += 1
+
+    # The cached answer for this question, or None
+    def get(self, namespace, embedding, model, version, doc_ids, context=''):
+        key = self._key(model, version, doc_ids, context)
+        query = normalize_rows(embedding)[0]
+        with self._lock:
+            self._prune(namespace, version)
+            best_id, best_score = None, self.threshold
+            for entry_id, (entry_namespace, entry_key, entry_embedding, _, _) in self._entries.items():
+                if entry_namespace != namespace or entry_key != key:
+                    continue
+                score = float(query @ entry_embedding)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][3]
+
+    def put(self, namespace, embedding, model, version, doc_ids, answer, context=''):
+        key = self._key(model, version, doc_ids, context)
+        with self._lock:
+            self._entries[self._next_id] = (namespace, key, normalize_rows(embedding)[0], answer, time.monotonic())
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, namespace=None):
+        with self._lock:
+            if namespace is None:
+                self._entries.clear()
+                return
+            for entry_id in [i for i, entry in self._entries.items() if entry[0] == namespace]:
+                del self._entries[entry_id]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'invalidated': self.invalidated,
+                'entries': len(self._entries),
+            }
+
+
+_answer_cache = SemanticAnswerCache()
+
+
+def get_answer_cache():
+    return _answer_cache
+
+
+# The answer cache for one turn of a tool-calling page, passed to
+# stream_with_tools: get() is asked after the first tool round, and put()
+# receives what was streamed after it when get() missed
+class ToolAnswerCache:
+    def __init__(self, namespace, embedding, model, version, context='', cache=None):
+        self.namespace = namespace
+        self.embedding = embedding
+        self.model = model
+        self.version = version
+        self.context = context
+        self.cache = cache or _answer_cache
+        self._round_key = None
+
+    def _key(self):
+        return dict(embedding=self.embedding, model=self.model, version=self.version,
+                    doc_ids=(), context=(self.context, self._round_key))
+
+    def get(self, tool_calls, tool_messages):
+        self._round_key = tool_round_key(tool_calls, tool_messages)
+        return self.cache.get(self.namespace, **self._key())
+
+    def put(self, answer):
+        if self._round_key is not None and answer:
+            self.cache.put(self.namespace, answer=answer, **self._key())
@@ -0,0 +1,258 @@
+import asyncio
+import json
+import random
+import time
+
+import openai
+from openai import AsyncOpenAI
+
+from utils.embedding_cache import EMBEDDING_MODEL, get_default_cache
+
+# ===================================================================
+# Concurrent embedding + ingest engine
+# ===================================================================
+# Takes an iterable of batches (lists of {'id', 'text', 'metadata'}
+# records), embeds several batches at once with AsyncOpenAI and upserts
+# each one into a ChromaDB collection as soon as its vectors arrive.
+#
+# - At most `concurrency` embedding requests are in flight. The limit
+#   shrinks when the x-ratelimit-remaining-* headers run low or a 429
+#   comes back, and grows again while there is headroom.
+# - Retryable failures (429, 5xx, timeouts, dropped connections) back off
+#   exponentially with full jitter, honouring Retry-After when sent.
+# - Rows that still fail after max_retries, or that the API rejects
+#   outright, are appended to a dead-letter JSONL file instead of
+#   killing the whole run.
+# - Every text goes through the shared embedding cache first.
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 6
+DEFAULT_DEAD_LETTER_PATH = './dead_letter.jsonl'
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+# Full-jitter exponential backoff: a random delay between 0 and
+# base * 2**attempt (capped), but never shorter than Retry-After
+def backoff_delay(attempt, base=0.5, cap=30.0, retry_after=None):
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def _retry_after(error):
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _header_fraction(headers, remaining_key, limit_key):
+    try:
+        return float(headers[remaining_key]) / float(headers[limit_key])
+    except (KeyError, TypeError, ValueError, ZeroDivisionError):
+        return None
+
+
+# A semaphore whose size can change while it is in use
+class AdaptiveLimiter:
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            while self.in_flight >= self.limit:
+                await self._cond.wait()
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    async def _set_limit(self, limit):
+        async with self._cond:
+            self.limit = max(1, min(self.max_concurrency, limit))
+            self._cond.notify_all()
+
+    # Adjust concurrency from the RPM/TPM headers of a successful response
+    async def on_headers(self, headers):
+        fractions = [
+            f for f in (
+                _header_fraction(headers, 'x-ratelimit-remaining-requests', 'x-ratelimit-limit-requests'),
+                _header_fraction(headers, 'x-ratelimit-remaining-tokens', 'x-ratelimit-limit-tokens'),
+            ) if f is not None
+        ]
+        if not fractions:
+            return
+        headroom = min(fractions)
+        if headroom < 0.1:
+            await self._set_limit(self.limit // 2)
+        elif headroom > 0.5 and self.limit < self.max_concurrency:
+            await self._set_limit(self.limit + 1)
+
+    async def on_rate_limited(self):
+        await self._set_limit(self.limit // 2)
+
+
+def _write_dead_letters(path, records, error):
+    with open(path, 'a', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps({
+                'id': record['id'],
+                'text': record['text'],
+                'metadata': record.get('metadata'),
+                'error': f"{type(error).__name__}: {error}",
+                'failed_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }) + '\n')
+
+
+def upsert_records(collection, records, embeddings):
+    kwargs = {}
+    # ChromaDB rejects empty metadata dicts, so only send metadata if every record has some
+    if all(record.get('metadata') for record in records):
+        kwargs['metadatas'] = [record['metadata'] for record in records]
+    collection.upsert(
+        ids=[record['id'] for record in records],
+        documents=[record['text'] for record in records],
+        embeddings=embeddings,
+        **kwargs
+    )
+
+
+class _IngestRun:
+    def __init__(self, aclient, collection, model, dimensions, concurrency,
+                 max_retries, dead_letter_path, on_progress, on_batch):
+        self.aclient = aclient
+        self.collection = collection
+        self.model = model
+        self.dimensions = dimensions
+        self.max_retries = max_retries
+        self.dead_letter_path = dead_letter_path
+        self.on_progress = on_progress
+        self.on_batch = on_batch
+        self.limiter = AdaptiveLimiter(concurrency)
+        self.cache = get_default_cache()
+        self.stats = {'rows': 0, 'failed': 0, 'retries': 0, 'requests': 0, 'elapsed': 0.0}
+        self.start = time.perf_counter()
+
+    async def _embed(self, texts):
+        kwargs = {'dimensions': self.dimensions} if self.dimensions else {}
+        await self.limiter.acquire()
+        try:
+            raw = await self.aclient.embeddings.with_raw_response.create(
+                input=texts, model=self.model, **kwargs
+            )
+        finally:
+            await self.limiter.release()
+        self.stats['requests'] += 1
+        await self.limiter.on_headers(raw.headers)
+        response = raw.parse()
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    # Embed a batch through the cache, retrying transient failures
+    async def _embed_with_retry(self, texts):
+        embeddings = self.cache.get_many(self.model, self.dimensions, texts)
+        missing = list(dict.fromkeys(t for t, e in zip(texts, embeddings) if e is None))
+        if missing:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    vectors = await self._embed(missing)
+                    break
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    if isinstance(e, openai.RateLimitError):
+                        await self.limiter.on_rate_limited()
+                    self.stats['retries'] += 1
+                    await asyncio.sleep(backoff_delay(attempt, retry_after=_retry_after(e)))
+            self.cache.put_many(self.model, self.dimensions, missing, vectors)
+            new_vectors = dict(zip(missing, vectors))
+            embeddings = [e if e is not None else new_vectors[t] for t, e in zip(texts, embeddings)]
+        return embeddings
+
+    # Embed and store one batch, then report it as finished (stored or
+    # dead-lettered) through on_batch
+    async def process(self, records):
+        await self._process(records)
+        if self.on_batch:
+            self.on_batch(records)
+
+    async def _process(self, records):
+        try:
+            embeddings = await self._embed_with_retry([r['text'] for r in records])
+        except RETRYABLE_ERRORS as e:
+            _write_dead_letters(self.dead_letter_path, records, e)
+            self.stats['failed'] += len(records)
+            return
+        except openai.BadRequestError as e:
+            # One bad row (e.g. too long) rejects the whole request. Split
+            # the batch to isolate it so the good rows still get in.
+            if len(records) > 1:
+                mid = len(records) // 2
+                await asyncio.gather(self._process(records[:mid]), self._process(records[mid:]))
+            else:
+                _write_dead_letters(self.dead_letter_path, records, e)
+                self.stats['failed'] += 1
+            return
+
+        upsert_records(self.collection, records, embeddings)
+        self.stats['rows'] += len(records)
+        self.stats['elapsed'] = time.perf_counter() - self.start
+        if self.on_progress:
+            self.on_progress(self.stats)
+
+    async def run(self, batches):
+        batch_iter = iter(batches)
+        pending = set()
+        exhausted = False
+        while True:
+            # Keep a few batches queued beyond what is in flight. Batches are
+            # pulled in a worker thread so slow producers (CSV reading, HTML
+            # parsing) overlap with the embedding requests.
+            while not exhausted and len(pending) < self.limiter.max_concurrency * 2:
+                batch = await asyncio.to_thread(next, batch_iter, None)
+                if batch is None:
+                    exhausted = True
+                elif batch:
+                    pending.add(asyncio.create_task(self.process(batch)))
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        self.stats['elapsed'] = time.perf_counter() - self.start
+        return self.stats
+
+
+async def ingest_batches_async(batches, collection, api_key=None, model=EMBEDDING_MODEL,
+                               dimensions=None, concurrency=DEFAULT_CONCURRENCY,
+                               max_retries=DEFAULT_MAX_RETRIES,
+                               dead_letter_path=DEFAULT_DEAD_LETTER_PATH,
+                               on_progress=None, on_batch=None, base_url=None):
+    # Retries are handled here, so turn off the client's own
+    aclient = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+    try:
+        run = _IngestRun(aclient, collection, model, dimensions, concurrency,
+                         max_retries, dead_letter_path, on_progress, on_batch)
+        return await run.run(batches)
+    finally:
+        await aclient.close()
+
+
+# Synchronous entry point for scripts and Streamlit pages.
+# Returns a stats dict: rows, failed, retries, requests, elapsed.
+def ingest_batches(batches, collection, **kwargs):
+    return asyncio.run(ingest_batches_async(batches, collection, **kwargs))
@@ -0,0 +1,102 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+
+# ===================================================================
+# Local BM25 keyword index + reciprocal rank fusion
+# ===================================================================
+# Embedding search is good at topics but fuzzy on names: a query like
+# "JPMorgan" can rank generic finance stories above the articles that
+# actually mention JPMorgan. A small inverted index scored with BM25 finds
+# exact entity matches, and reciprocal rank fusion (RRF) merges its
+# ranking with the vector ranking without having to calibrate the two
+# kinds of score against each other.
+#
+# The index is built at ingest time and saved as JSON next to the
+# ChromaDB files.
+
+BM25_INDEX_NAME = 'bm25_index.json'
+
+_TOKEN_RE = re.compile(r'\w+')
+_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have',
+    'in', 'is', 'it', 'its', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was',
+    'were', 'will', 'with',
+}
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, ids, doc_lens, postings, k1=1.5, b=0.75):
+        self.ids = ids
+        self.doc_lens = doc_lens
+        self.postings = postings  # term -> [[doc index, weighted term frequency], ...]
+        self.k1 = k1
+        self.b = b
+        self.avgdl = sum(doc_lens) / len(doc_lens) if doc_lens else 0.0
+
+    # fields_per_doc: one {field name: text} dict per document.
+    # field_weights: how much a term occurrence in each field counts, e.g.
+    # {'company': 3.0, 'document': 1.0} so a company-name match outweighs
+    # a passing mention in the text.
+    @classmethod
+    def build(cls, ids, fields_per_doc, field_weights, k1=1.5, b=0.75):
+        postings = {}
+        doc_lens = []
+        for doc_index, fields in enumerate(fields_per_doc):
+            counts = Counter()
+            for field, text in fields.items():
+                weight = field_weights.get(field, 1.0)
+                for token in tokenize(text or ''):
+                    counts[token] += weight
+            doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append([doc_index, tf])
+        return cls(list(ids), doc_lens, postings, k1, b)
+
+    # Top k (id, score) pairs. `allowed` optionally restricts results to a
+    # set of IDs (e.g. the ones matching a metadata filter).
+    def search(self, query, k=10, allowed=None):
+        n_docs = len(self.ids)
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_index, tf in posting:
+                if allowed is not None and self.ids[doc_index] not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[doc_index] / self.avgdl)
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.ids[doc_index], score) for doc_index, score in best]
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'k1': self.k1, 'b': self.b, 'ids': self.ids,
+                       'doc_lens': self.doc_lens, 'postings': self.postings}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['ids'], data['doc_lens'], data['postings'], data['k1'], data['b'])
+
+
+# Merge several best-first ID rankings. Each list adds 1 / (k + rank) to
+# every ID it contains; k=60 is the usual constant from the RRF paper.
+def reciprocal_rank_fusion(rankings, k=60, limit=None):
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    fused = sorted(scores, key=scores.get, reverse=True)
+    return fused[:limit] if limit else fused
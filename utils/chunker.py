@@ -0,0 +1,141 @@
+import re
+from dataclasses import dataclass
+
+# ===================================================================
+# Token-aware chunking shared by the news, syllabus and org loaders
+# ===================================================================
+# Text is split along its own structure first (blank-line paragraphs,
+# then lines/fields, then sentences, then words) and the pieces are
+# packed greedily into chunks of at most max_tokens, with up to
+# overlap_tokens of trailing pieces repeated at the start of the next
+# chunk. Every chunk is a contiguous slice of the input, so its start/end
+# character offsets can be stored in metadata and point back at the source.
+#
+# Tokens are counted locally with tiktoken's cl100k_base encoding (the one
+# text-embedding-3-small and the gpt-4 family use). If tiktoken or its
+# encoding file is not available we fall back to a word-based estimate.
+
+TOKENIZER_ENCODING = 'cl100k_base'
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception:
+            # Not installed, or the encoding file cannot be downloaded
+            _encoding = None
+    return _encoding
+
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Roughly one token per 4 characters of a word, one per punctuation mark
+    return sum(max(1, (len(w) + 3) // 4) for w in _WORD_RE.findall(text))
+
+
+@dataclass(frozen=True)
+class ChunkPolicy:
+    max_tokens: int = 400
+    overlap_tokens: int = 50
+
+
+# Separators tried in order, from coarsest to finest structure
+_SPLITTERS = [
+    re.compile(r'\n\s*\n'),         # paragraphs
+    re.compile(r'\n'),              # lines / "Field: value" rows
+    re.compile(r'(?<=[.!?])\s+'),   # sentences
+    re.compile(r'\s+'),             # words
+]
+
+
+# Split text[start:end] into pieces at the given separator level.
+# Returns (start, end) spans covering the text, separators attached to the
+# piece before them so spans stay contiguous.
+def _split_spans(text, start, end, splitter):
+    spans = []
+    piece_start = start
+    for match in splitter.finditer(text, start, end):
+        if match.end() > piece_start and match.start() > piece_start:
+            spans.append((piece_start, match.end()))
+            piece_start = match.end()
+    if piece_start < end:
+        spans.append((piece_start, end))
+    return spans
+
+
+# Break text into units that each fit in max_tokens, using the coarsest
+# structure possible
+def _units(text, start, end, max_tokens, level=0):
+    tokens = count_tokens(text[start:end])
+    if tokens <= max_tokens or level >= len(_SPLITTERS):
+        return [(start, end, tokens)]
+    spans = _split_spans(text, start, end, _SPLITTERS[level])
+    if len(spans) == 1:
+        return _units(text, start, end, max_tokens, level + 1)
+    units = []
+    for s, e in spans:
+        units.extend(_units(text, s, e, max_tokens, level + 1))
+    return units
+
+
+# Split text into chunks. Returns a list of dicts:
+#   {'index', 'text', 'start', 'end', 'tokens'}
+# `prefix` (e.g. "Organization: X") is prepended to every chunk after the
+# first so each chunk still says what it is about; offsets always refer
+# to the original text.
+def chunk_text(text, policy=ChunkPolicy(), prefix=None):
+    if not text.strip():
+        return []
+
+    # Leave room for the prefix so prefixed chunks stay within max_tokens
+    max_tokens = policy.max_tokens - (count_tokens(prefix) + 1 if prefix else 0)
+    units = _units(text, 0, len(text), max_tokens)
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    def close():
+        start, end = current[0][0], current[-1][1]
+        chunk = text[start:end].strip()
+        if prefix and start > 0:
+            chunk = f"{prefix}\n{chunk}"
+        chunks.append({
+            'index': len(chunks),
+            'text': chunk,
+            'start': start,
+            'end': end,
+            'tokens': current_tokens,
+        })
+
+    for unit in units:
+        if current and current_tokens + unit[2] > max_tokens:
+            close()
+            # Carry trailing units into the next chunk as overlap
+            overlap = []
+            overlap_tokens = 0
+            for prev in reversed(current):
+                if overlap_tokens + prev[2] > policy.overlap_tokens or \
+                        overlap_tokens + prev[2] + unit[2] > max_tokens:
+                    break
+                overlap.insert(0, prev)
+                overlap_tokens += prev[2]
+            current = overlap
+            current_tokens = overlap_tokens
+        current.append(unit)
+        current_tokens += unit[2]
+
+    if current:
+        close()
+    return chunks
@@ -0,0 +1,151 @@
+import os
+
+from utils.chunker import ChunkPolicy, chunk_text, count_tokens
+
+# ===================================================================
+# Token-budgeted prompt assembly for the chat pages
+# ===================================================================
+# Instead of resending the whole chat, or a fixed number of messages no
+# matter how long they are, every turn's prompt is packed into a per-model
+# token budget, counted locally with the chunker's tokenizer. In order of
+# priority:
+#   1. the system instructions and the current question, always sent;
+#   2. the most recent exchanges (keep_recent messages), however much
+#      retrieved context there is, so the chat never loses its memory;
+#   3. retrieved chunks in rank order, using at most chunk_share of the
+#      budget; the first chunk that doesn't fit is cut down to the room
+#      left (along its paragraphs/sentences) rather than dropped;
+#   4. earlier messages, newest first, whole messages only, stopping at
+#      the first one that doesn't fit; the kept history starts on a user
+#      message (Anthropic requires it, and a reply without its question
+#      is noise);
+#   5. whatever budget is left goes to the chunks skipped in step 3.
+# Chunks are appended to the system prompt in rank order, as before.
+# Pages whose context arrives as tool results during the turn pass
+# reserve_for_tools=True, which holds chunk_share of the budget back for
+# them instead.
+#
+# The report says how many tokens were sent and how many were saved
+# compared to sending every message and chunk.
+#
+# RAG_CONTEXT_BUDGET sets one budget for every model.
+
+MODEL_CONTEXT_BUDGETS = {
+    'gpt-4o-mini': 6000,
+    'gpt-4o': 6000,
+    'gpt-4.1-mini': 8000,
+    'gpt-4.1': 8000,
+    'claude-sonnet-4-20250514': 6000,
+}
+DEFAULT_CONTEXT_BUDGET = 6000
+DEFAULT_CHUNK_SHARE = 0.5
+DEFAULT_KEEP_RECENT = 4  # the last two exchanges
+
+# A chunk is only cut down if at least this much of it still fits
+MIN_TRUNCATED_CHUNK = 100
+
+# Per-message formatting tokens, and the tokens that prime the reply
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+
+
+def context_budget(model):
+    override = os.environ.get('RAG_CONTEXT_BUDGET')
+    if override:
+        return int(override)
+    return MODEL_CONTEXT_BUDGETS.get(model, DEFAULT_CONTEXT_BUDGET)
+
+
+def message_tokens(message):
+    return count_tokens(message['content'] or '') + MESSAGE_OVERHEAD
+
+
+# The start of `chunk` that fits in max_tokens, cut along its own
+# structure, or None if too little of it would fit
+def _truncate(chunk, max_tokens):
+    if max_tokens < MIN_TRUNCATED_CHUNK:
+        return None
+    pieces = chunk_text(chunk, ChunkPolicy(max_tokens=max_tokens, overlap_tokens=0))
+    if not pieces:
+        return None
+    # Keep the separator the chunk ended with
+    text = pieces[0]['text'] + chunk[len(chunk.rstrip()):]
+    return text if count_tokens(text) <= max_tokens else None
+
+
+# Build the messages for one turn. `history` is the chat so far, ending
+# with the current user message; `chunks` are retrieved context strings,
+# best first, already formatted to be appended to the system prompt.
+# Returns (messages, report).
+def assemble_context(model, system_prompt, history, chunks=(), budget=None,
+                     chunk_share=DEFAULT_CHUNK_SHARE, reserve_for_tools=False,
+                     keep_recent=DEFAULT_KEEP_RECENT):
+    full_budget = budget or context_budget(model)
+    budget = int(full_budget * (1 - chunk_share)) if reserve_for_tools else full_budget
+    earlier, question = history[:-1], history[-1]
+    chunk_tokens = [count_tokens(chunk) for chunk in chunks]
+    history_tokens = [message_tokens(message) for message in earlier]
+
+    # 1. Always sent
+    used = count_tokens(system_prompt) + MESSAGE_OVERHEAD + message_tokens(question) + REPLY_OVERHEAD
+
+    # 2. The most recent exchanges, ahead of any retrieved context
+    start = len(earlier)
+    while start > max(0, len(earlier) - keep_recent) and used + history_tokens[start - 1] <= budget:
+        start -= 1
+        used += history_tokens[start]
+
+    # 3. Retrieved chunks, up to their share of the budget
+    kept_chunks = {}  # index -> text sent
+    chunks_used = 0
+    for i, tokens in enumerate(chunk_tokens):
+        room = min(budget * chunk_share - chunks_used, budget - used)
+        if tokens <= room:
+            kept_chunks[i] = chunks[i]
+        else:
+            text = _truncate(chunks[i], int(room))
+            if text is None:
+                continue
+            kept_chunks[i] = text
+            tokens = count_tokens(text)
+        used += tokens
+        chunks_used += tokens
+
+    # 4. Older history, newest first
+    while start > 0 and used + history_tokens[start - 1] <= budget:
+        start -= 1
+        used += history_tokens[start]
+    while start < len(earlier) and earlier[start]['role'] != 'user':
+        used -= history_tokens[start]
+        start += 1
+
+    # 5. Leftover budget to the remaining chunks
+    for i, tokens in enumerate(chunk_tokens):
+        if i not in kept_chunks and used + tokens <= budget:
+            kept_chunks[i] = chunks[i]
+            used += tokens
+
+    system = system_prompt + ''.join(kept_chunks[i] for i in sorted(kept_chunks))
+    messages = [{'role': 'system', 'content': system}, *earlier[start:], question]
+
+    full = (count_tokens(system_prompt) + MESSAGE_OVERHEAD + message_tokens(question) + REPLY_OVERHEAD
+            + sum(chunk_tokens) + sum(history_tokens))
+    report = {
+        'budget': full_budget,
+        'tokens': used,
+        'full_tokens': full,
+        'saved_tokens': full - used,
+        'messages_dropped': start,
+        'chunks_dropped': len(chunks) - len(kept_chunks),
+        'chunks_truncated': sum(kept_chunks[i] is not chunks[i] for i in kept_chunks),
+    }
+    return messages, report
+
+
+# One line for a sidebar caption
+def format_context_report(report):
+    text = f"Context: {report['tokens']:,} of {report['budget']:,} tokens"
+    if report['saved_tokens']:
+        text += (f", {report['saved_tokens']:,} saved ({report['messages_dropped']} earlier messages, "
+                 f"{report['chunks_dropped']} chunks left out, {report['chunks_truncated']} cut short)")
+    return text
@@ -0,0 +1,108 @@
+import hashlib
+import random
+import re
+from array import array
+
+# ===================================================================
+# Exact and near-duplicate detection for ingest pipelines
+# ===================================================================
+# Exact duplicates are caught by hashing the normalized text.
+# Near-duplicates (the same story with a slightly different headline or
+# trailing "..." snippet) are caught with MinHash signatures over word
+# shingles, bucketed with LSH so each new document is only compared with
+# a handful of candidates instead of every document seen so far.
+#
+# Only hashes and signatures are kept in memory, never the documents,
+# so this works on a stream of rows as well as on a list.
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_text(text):
+    return re.sub(r'\s+', ' ', text.lower()).strip()
+
+
+def shingles(text, size=3):
+    words = re.findall(r'\w+', text.lower())
+    if len(words) <= size:
+        return {' '.join(words)}
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class Deduplicator:
+    # threshold: estimated Jaccard similarity above which two documents are
+    #   treated as the same story.
+    # bands * rows_per_band must equal num_perm. 16 bands of 4 rows puts
+    #   the LSH candidate cut-off around 0.5 similarity, well below the
+    #   threshold, so few true near-duplicates are missed.
+    def __init__(self, threshold=0.8, num_perm=64, bands=16, shingle_size=3, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = random.Random(seed)
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+        self._exact = {}       # text hash -> representative key
+        self._buckets = {}     # band key -> [representative keys]
+        self._signatures = {}  # representative key -> signature
+
+    def signature(self, text):
+        hashed = [_hash64(s) for s in shingles(text, self.shingle_size)]
+        # A compact unsigned 64-bit array rather than a tuple of Python ints,
+        # so the index stays small on multi-million row streams
+        return array('Q', (
+            min((a * h + b) % _MERSENNE_PRIME for h in hashed)
+            for a, b in self._perms
+        ))
+
+    # Bucket keys are plain ints (hash of the band number and its values)
+    def _band_keys(self, signature):
+        r = self.rows_per_band
+        return [hash((band, *signature[band * r:(band + 1) * r])) for band in range(self.bands)]
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+    # Register a document. Returns None if it is new (and becomes a
+    # representative), otherwise the key of the representative it duplicates.
+    def add(self, key, text):
+        text_hash = hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+        if text_hash in self._exact:
+            return self._exact[text_hash]
+
+        signature = self.signature(text)
+        band_keys = self._band_keys(signature)
+
+        best_key, best_sim = None, 0.0
+        seen = set()
+        for band_key in band_keys:
+            for candidate in self._buckets.get(band_key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                sim = self.similarity(signature, self._signatures[candidate])
+                if sim > best_sim:
+                    best_key, best_sim = candidate, sim
+
+        if best_key is not None and best_sim >= self.threshold:
+            self._exact[text_hash] = best_key
+            return best_key
+
+        self._exact[text_hash] = key
+        self._signatures[key] = signature
+        for band_key in band_keys:
+            self._buckets.setdefault(band_key, []).append(key)
+        return None
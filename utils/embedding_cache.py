@@ -0,0 +1,161 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+
+# ===================================================================
+# Persistent, content-addressed embedding cache
+# ===================================================================
+# Every embedding we pay for is stored in a small SQLite file keyed by
+# (model, dimensions, sha256(text)). Rebuilding a collection, or asking
+# the same question again, then reads the vector back from disk instead
+# of calling the API. The file is shared by build_db.py and all the
+# Streamlit pages, so whoever embeds a text first pays for everyone.
+
+EMBEDDING_MODEL = 'text-embedding-3-small'
+DEFAULT_CACHE_PATH = './embedding_cache.sqlite3'
+DEFAULT_MAX_ENTRIES = 200_000
+
+# The embeddings endpoint accepts at most 2048 inputs per request
+MAX_INPUTS_PER_REQUEST = 2048
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # One connection shared by all threads (Streamlit runs each session
+        # in its own thread), guarded by a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " dimensions INTEGER NOT NULL,"
+                " text_hash TEXT NOT NULL,"
+                " embedding BLOB NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " PRIMARY KEY (model, dimensions, text_hash))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+            )
+            self._conn.commit()
+
+    # Look up a list of texts. Returns a list with the cached embedding, or
+    # None, for each text.
+    def get_many(self, model, dimensions, texts):
+        dims = dimensions or 0
+        hashes = [text_hash(t) for t in texts]
+        found = {}
+        with self._lock:
+            # SQLite limits the number of bound parameters, so look up in slices
+            for start in range(0, len(hashes), 500):
+                part = list(set(hashes[start:start + 500]))
+                placeholders = ','.join('?' * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, embedding FROM embeddings"
+                    f" WHERE model = ? AND dimensions = ? AND text_hash IN ({placeholders})",
+                    [model, dims, *part]
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = array('f', blob).tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND dimensions = ? AND text_hash = ?",
+                    [(now, model, dims, h) for h in found]
+                )
+                self._conn.commit()
+
+            results = [found.get(h) for h in hashes]
+            hit_count = sum(1 for r in results if r is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+
+    def put_many(self, model, dimensions, texts, embeddings):
+        dims = dimensions or 0
+        now = time.time()
+        rows = [
+            (model, dims, text_hash(t), array('f', e).tobytes(), now)
+            for t, e in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, dimensions, text_hash, embedding, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    # Size-bounded eviction: drop the least recently used entries once the
+    # cache grows past max_entries
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN"
+                " (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            self.evictions += excess
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+        }
+
+
+# One cache per process, opened on first use
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+        return _default_cache
+
+
+# Embed a list of texts through the cache. Cached vectors are read from
+# disk; the rest are embedded with as few API calls as possible and stored.
+# Returns one embedding per input text, in order.
+def embed_texts(client, texts, model=EMBEDDING_MODEL, dimensions=None, cache=None):
+    cache = cache or get_default_cache()
+    embeddings = cache.get_many(model, dimensions, texts)
+
+    # Embed each distinct missing text once
+    missing = list(dict.fromkeys(t for t, e in zip(texts, embeddings) if e is None))
+    new_vectors = {}
+    for start in range(0, len(missing), MAX_INPUTS_PER_REQUEST):
+        part = missing[start:start + MAX_INPUTS_PER_REQUEST]
+        kwargs = {'dimensions': dimensions} if dimensions else {}
+        response = client.embeddings.create(input=part, model=model, **kwargs)
+        vectors = [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+        cache.put_many(model, dimensions, part, vectors)
+        new_vectors.update(zip(part, vectors))
+
+    return [e if e is not None else new_vectors[t] for t, e in zip(texts, embeddings)]
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+# ===================================================================
+# Build manifests for prebuilt vector databases
+# ===================================================================
+# An offline build script writes manifest.json next to the ChromaDB files,
+# recording what it was built from (source file hashes), how (embedding
+# model, dimensions, chunk policy) and what it produced (chunk count).
+# Pages check the manifest before opening the database, so a missing or
+# out-of-date build (new sources, or settings the app no longer uses)
+# fails fast instead of silently serving an empty or stale collection.
+
+MANIFEST_NAME = 'manifest.json'
+
+# sha256 per (path, size, mtime), so unchanged files are hashed once per process
+_hash_cache = {}
+
+
+def file_sha256(path):
+    stat = os.stat(path)
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _hash_cache:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        _hash_cache[key] = digest.hexdigest()
+    return _hash_cache[key]
+
+
+def source_hashes(paths):
+    return {Path(p).name: {'sha256': file_sha256(p), 'size': os.path.getsize(p)} for p in paths}
+
+
+def write_manifest(db_path, sources, **fields):
+    manifest = {
+        'build_id': uuid.uuid4().hex,
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'sources': sources,
+        **fields,
+    }
+    os.makedirs(db_path, exist_ok=True)
+    tmp_path = os.path.join(db_path, MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(db_path, MANIFEST_NAME))
+    return manifest
+
+
+def load_manifest(db_path):
+    path = os.path.join(db_path, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Returns None if the build in db_path is up to date with source_paths
+# and was built with the `expected` settings (e.g. model=...), otherwise a
+# short description of what is wrong
+def check_manifest(db_path, source_paths, **expected):
+    manifest = load_manifest(db_path)
+    if manifest is None:
+        return f"No prebuilt database found in {db_path}."
+
+    recorded = manifest.get('sources', {})
+    current = {Path(p).name: p for p in source_paths}
+    if set(recorded) != set(current):
+        added = len(set(current) - set(recorded))
+        removed = len(set(recorded) - set(current))
+        return f"The database in {db_path} is stale: {added} source files added, {removed} removed since it was built."
+
+    # Cheap size check first, then content hashes
+    for name, path in current.items():
+        if os.path.getsize(path) != recorded[name]['size'] or file_sha256(path) != recorded[name]['sha256']:
+            return f"The database in {db_path} is stale: {name} changed since it was built."
+
+    for field, value in expected.items():
+        if manifest.get(field) != value:
+            return (f"The database in {db_path} is stale: it was built with {field}={manifest.get(field)!r}, "
+                    f"not {value!r}.")
+    return None
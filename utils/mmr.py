@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+
+from utils.vectors import normalize_rows
+
+# ===================================================================
+# Maximal marginal relevance (MMR) re-ranking
+# ===================================================================
+# Plain top-k retrieval often returns near-copies: the same story from
+# several outlets, or the identity and contact chunks of one org. MMR
+# over-fetches candidates and then picks them one at a time, each time
+# taking the candidate that maximises
+#
+#     lambda * relevance - (1 - lambda) * max similarity to those already picked
+#
+# so k results cover more ground than the plain top k. lambda = 1 is plain
+# relevance order; lower values favour diversity. Relevance and
+# similarities are all cosine similarities between the vectors, so they
+# don't depend on the collection's distance space (l2, ip or cosine).
+
+DEFAULT_MMR_LAMBDA = float(os.environ.get('RAG_MMR_LAMBDA', 0.7))
+DEFAULT_FETCH_FACTOR = 4  # candidates fetched per result kept
+
+
+# Indices of the k candidates MMR picks, in pick order.
+# relevance: one score per candidate (higher is better), on a scale
+# comparable to cosine similarity.
+def mmr_select(relevance, embeddings, k, lambda_mult=DEFAULT_MMR_LAMBDA):
+    relevance = np.asarray(relevance, dtype=np.float32)
+    k = min(k, len(relevance))
+    if k == 0:
+        return []
+    vectors = normalize_rows(embeddings)
+    similarity = vectors @ vectors.T
+
+    picked = [int(np.argmax(relevance))]
+    # Highest similarity of each candidate to anything picked so far
+    redundancy = similarity[picked[0]].copy()
+    available = np.ones(len(relevance), dtype=bool)
+    available[picked[0]] = False
+    while len(picked) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return picked
+
+
+# Query a retriever for fetch_k candidates and keep the k that MMR picks.
+# Returns a query()-shaped result for the single query embedding.
+def query_mmr(retriever, query_embedding, k, fetch_k=None, lambda_mult=DEFAULT_MMR_LAMBDA,
+              where=None):
+    results = retriever.query(
+        query_embeddings=[query_embedding],
+        n_results=fetch_k or k * DEFAULT_FETCH_FACTOR,
+        where=where,
+        include=['documents', 'metadatas', 'distances', 'embeddings']
+    )
+    embeddings = results['embeddings'][0]
+    if not len(embeddings):
+        return results
+    # Cosine similarity to the query; 1 - distance only holds for cosine spaces
+    relevance = normalize_rows(embeddings) @ normalize_rows(query_embedding)[0]
+    picked = mmr_select(relevance, embeddings, k, lambda_mult)
+    return {
+        key: [[results[key][0][i] for i in picked]]
+        for key in ('ids', 'documents', 'metadatas', 'distances')
+    }
+
+
+# Re-rank an already ranked list of IDs (e.g. from fusion or a precomputed
+# ranking). Fetches the candidates with their vectors and returns
+# (documents, metadatas) of the k picked, in MMR order. `relevance`
+# defaults to rank order (1 for the first ID, falling linearly).
+def rerank_ids(retriever, ranked_ids, k, relevance=None, lambda_mult=DEFAULT_MMR_LAMBDA):
+    if not ranked_ids:
+        return [], []
+    if relevance is None:
+        relevance = 1.0 - np.arange(len(ranked_ids)) / len(ranked_ids)
+
+    fetched = retriever.get(ranked_ids, include=['documents', 'metadatas', 'embeddings'])
+    # get() does not promise to keep the requested order
+    position = {doc_id: i for i, doc_id in enumerate(fetched['ids'])}
+    order = [i for i, doc_id in enumerate(ranked_ids) if doc_id in position]
+    rows = [position[ranked_ids[i]] for i in order]
+    if not rows:
+        return [], []
+
+    embeddings = np.asarray(fetched['embeddings'], dtype=np.float32)[rows]
+    picked = mmr_select(np.asarray(relevance, dtype=np.float32)[order], embeddings, k, lambda_mult)
+    return ([fetched['documents'][rows[i]] for i in picked],
+            [fetched['metadatas'][rows[i]] for i in picked])
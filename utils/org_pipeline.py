@@ -0,0 +1,235 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from lxml import etree
+from lxml import html as lxml_html
+
+from utils.chunker import ChunkPolicy, chunk_text
+
+# ===================================================================
+# Student org parsing pipeline (extract -> chunk), shared by HW4
+# ===================================================================
+# These functions live at module level (not inside hw4()) so they can be
+# sent to worker processes: parsing 500+ HTML files is CPU-bound, so it
+# fans out over a ProcessPoolExecutor and scales with the number of cores.
+
+# Where the prebuilt student org database lives (see build_orgs_db.py)
+ORG_SOURCE_FOLDER = './su_orgs/'
+ORG_DB_PATH = './ChromaDB_for_HW4'
+ORG_COLLECTION_NAME = 'HW4Collection'
+
+# Long descriptions are split so no chunk goes over this many tokens
+ORG_CHUNK_POLICY = ChunkPolicy(max_tokens=350, overlap_tokens=40)
+
+INITIAL_STATE_MARKER = 'window.initialAppState'
+_json_decoder = json.JSONDecoder()
+
+
+# ===================================================================
+# FUNCTION: Find the window.initialAppState JSON in a page
+# ===================================================================
+# A plain str.find for the marker, then raw_decode parses exactly one
+# JSON object starting at the opening brace and stops where it ends.
+# No regex, so no backtracking over the ~50 KB page.
+def find_initial_app_state(content):
+    marker = content.find(INITIAL_STATE_MARKER)
+    if marker == -1:
+        return None
+
+    after_marker = marker + len(INITIAL_STATE_MARKER)
+    start = content.find('{', after_marker)
+    # Only "=" and whitespace may sit between the marker and the object
+    if start == -1 or content[after_marker:start].strip() != '=':
+        return None
+
+    try:
+        data, _ = _json_decoder.raw_decode(content, start)
+    except json.JSONDecodeError:
+        return None
+    return data
+
+
+# ===================================================================
+# FUNCTION: Strip HTML tags from a description
+# ===================================================================
+# lxml's C parser is much faster than BeautifulSoup's html.parser. Text
+# nodes are joined with spaces like get_text(separator=' ') did.
+def strip_tags(raw_html):
+    if '<' not in raw_html and '&' not in raw_html:
+        return raw_html.strip()
+    try:
+        fragment = lxml_html.fragment_fromstring(raw_html, create_parent='div')
+    except (etree.ParserError, ValueError):
+        return raw_html.strip()
+    return ' '.join(fragment.itertext()).strip()
+
+
+# ===================================================================
+# FUNCTION: Extract organization data from an HTML file
+# ===================================================================
+# Each HTML file contains a JSON blob in window.initialAppState
+# with all the org info. We parse the JSON and extract useful fields.
+def extract_org_data(html_path):
+    with open(html_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    # Find the JSON blob in the script tag
+    data = find_initial_app_state(content)
+    if not data:
+        return None
+
+    org = data.get('preFetchedData', {}).get('organization')
+    if not org:
+        return None
+
+    # Clean HTML tags from the description field
+    raw_description = org.get('description', '') or ''
+    clean_description = strip_tags(raw_description)
+
+    # Extract contact info
+    contact = org.get('primaryContact', {}) or {}
+    contact_info_list = org.get('contactInfo', []) or []
+    social = org.get('socialMedia', {}) or {}
+
+    # Build contact details string
+    contact_parts = []
+    if contact.get('firstName') or contact.get('lastName'):
+        name = f"{contact.get('preferredFirstName') or contact.get('firstName', '')} {contact.get('lastName', '')}".strip()
+        contact_parts.append(f"Primary Contact: {name}")
+    if org.get('email'):
+        contact_parts.append(f"Email: {org['email']}")
+    if contact_info_list:
+        ci = contact_info_list[0]
+        if ci.get('phoneNumber'):
+            contact_parts.append(f"Phone: {ci['phoneNumber']}")
+        addr_parts = [ci.get('street1', ''), ci.get('city', ''), ci.get('state', ''), ci.get('zip', '')]
+        address = ', '.join(p.strip() for p in addr_parts if p and p.strip())
+        if address:
+            contact_parts.append(f"Address: {address}")
+    if social.get('externalWebsite'):
+        contact_parts.append(f"Website: {social['externalWebsite']}")
+    social_links = []
+    for platform in ['instagramUrl', 'facebookUrl', 'twitterUrl', 'linkedInUrl', 'youtubeUrl']:
+        if social.get(platform):
+            social_links.append(social[platform])
+    if social_links:
+        contact_parts.append(f"Social Media: {', '.join(social_links)}")
+
+    return {
+        'name': org.get('name', 'Unknown'),
+        'short_name': org.get('shortName', ''),
+        'summary': org.get('summary', '') or '',
+        'description': clean_description,
+        'status': org.get('status', ''),
+        'org_type': (org.get('organizationType', {}) or {}).get('name', ''),
+        'contact_details': '\n'.join(contact_parts),
+        'file_name': Path(html_path).stem  # filename without extension
+    }
+
+# ===================================================================
+# CHUNKING STRATEGY: Split each org into 2 mini-documents
+# ===================================================================
+# Method: Semantic chunking — splitting by content type
+#
+# Chunk 1 (Identity & Description): Contains the org's name, type,
+#   status, summary, and full description. This chunk answers
+#   "what is this organization?" and "what do they do?"
+#
+# Chunk 2 (Contact & Details): Contains the org's name (repeated
+#   for context), contact person, email, phone, address, website,
+#   and social media. This chunk answers "how do I reach them?"
+#
+# WHY this method: Semantic chunking groups related information
+# together, so vector search returns the most relevant chunk for
+# a given question type. A simple midpoint split could break a
+# sentence in half or mix unrelated info. With 513 orgs (1026
+# chunks), keeping chunks focused improves search accuracy.
+#
+# Each section then goes through the shared token-aware chunker: a long
+# description is split on its lines and sentences so no chunk goes over
+# ORG_CHUNK_POLICY.max_tokens, and every extra piece repeats the
+# "Organization: ..." line so it still says which org it is about.
+
+def chunk_org_data(org_data):
+    name = org_data['name']
+    short = f" ({org_data['short_name']})" if org_data['short_name'] else ""
+
+    # Chunk 1: Identity & Description
+    chunk1_parts = [
+        f"Organization: {name}{short}",
+        f"Type: {org_data['org_type']}" if org_data['org_type'] else "",
+        f"Status: {org_data['status']}" if org_data['status'] else "",
+        f"Summary: {org_data['summary']}" if org_data['summary'] else "",
+        f"Description: {org_data['description']}" if org_data['description'] else "",
+    ]
+    chunk1 = '\n'.join(p for p in chunk1_parts if p)
+
+    # Chunk 2: Contact & Details
+    chunk2_parts = [
+        f"Organization: {name}{short}",
+        org_data['contact_details'] if org_data['contact_details'] else "No contact information available.",
+    ]
+    chunk2 = '\n'.join(p for p in chunk2_parts if p)
+
+    return chunk1, chunk2
+
+
+# ===================================================================
+# FUNCTION: Parse one HTML file into chunk records
+# ===================================================================
+# Runs in a worker process. Returns a list of {'id', 'text', 'metadata'}
+# records (empty if the file has no organization data).
+def parse_org_file(html_path, policy=ORG_CHUNK_POLICY):
+    org_data = extract_org_data(html_path)
+    if not org_data:
+        return []
+
+    sections = chunk_org_data(org_data)
+    file_id = org_data['file_name']
+    header = sections[0].split('\n', 1)[0]  # "Organization: Name (Short)"
+
+    records = []
+    for section, text in zip(('identity', 'contact'), sections):
+        for chunk in chunk_text(text, policy, prefix=header):
+            # The first piece keeps the plain section ID, extra pieces are numbered
+            suffix = f"_{chunk['index'] + 1}" if chunk['index'] else ""
+            records.append({
+                'id': f"{file_id}_{section}{suffix}",
+                'text': chunk['text'],
+                'metadata': {
+                    'org': org_data['name'],
+                    'section': section,
+                    'chunk_index': chunk['index'],
+                    'chunk_start': chunk['start'],
+                    'chunk_end': chunk['end'],
+                },
+            })
+    return records
+
+
+# ===================================================================
+# FUNCTION: Parse a whole folder in parallel
+# ===================================================================
+# Yields each file's records in file order as soon as they are ready, so
+# the embedding stage can start while later files are still being parsed.
+def list_org_files(folder_path):
+    return sorted(Path(folder_path).glob('*.html'))
+
+
+def iter_org_records(folder_path, max_workers=None, chunksize=16):
+    html_files = list_org_files(folder_path)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for records in pool.map(parse_org_file, html_files, chunksize=chunksize):
+            yield records
+
+
+# Group parsed records into embedding batches as they arrive
+def iter_org_batches(folder_path, batch_size=100, max_workers=None):
+    batch = []
+    for records in iter_org_records(folder_path, max_workers):
+        batch.extend(records)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,81 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import fitz
+
+from utils.chunker import ChunkPolicy, chunk_text
+from utils.manifest import file_sha256
+
+# ===================================================================
+# PDF extraction pipeline for the syllabus RAG (Lab 4)
+# ===================================================================
+# - Text is extracted page by page with PyMuPDF, which is much faster than
+#   PyPDF2 and keeps page boundaries.
+# - Extracted pages are cached on disk by the PDF's sha256, so a file is
+#   only ever parsed once until its contents change.
+# - Files that are not cached yet are parsed in parallel worker processes.
+# - Each page is chunked with the shared token-aware chunker (usually one
+#   chunk per page, split on paragraphs/lines for dense pages) and tagged
+#   with source/page metadata, so a query retrieves the few relevant
+#   pages instead of whole syllabi.
+
+DEFAULT_TEXT_CACHE_DIR = './.pdf_text_cache'
+PDF_CHUNK_POLICY = ChunkPolicy(max_tokens=500, overlap_tokens=60)
+
+
+# Runs in a worker process: one string per page
+def extract_pdf_pages(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return [page.get_text() for page in doc]
+
+
+def _cache_path(cache_dir, sha):
+    return os.path.join(cache_dir, f"{sha}.json")
+
+
+# Returns [(pdf_path, [page texts])] in file order
+def extract_folder(folder_path, cache_dir=DEFAULT_TEXT_CACHE_DIR, max_workers=None):
+    pdf_files = sorted(Path(folder_path).glob('*.pdf'))
+    os.makedirs(cache_dir, exist_ok=True)
+
+    hashes = {pdf: file_sha256(pdf) for pdf in pdf_files}
+    pages_by_file = {}
+    to_extract = []
+    for pdf in pdf_files:
+        cached = _cache_path(cache_dir, hashes[pdf])
+        if os.path.exists(cached):
+            with open(cached, encoding='utf-8') as f:
+                pages_by_file[pdf] = json.load(f)
+        else:
+            to_extract.append(pdf)
+
+    if to_extract:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for pdf, pages in zip(to_extract, pool.map(extract_pdf_pages, to_extract)):
+                pages_by_file[pdf] = pages
+                with open(_cache_path(cache_dir, hashes[pdf]), 'w', encoding='utf-8') as f:
+                    json.dump(pages, f)
+
+    return [(pdf, pages_by_file[pdf]) for pdf in pdf_files]
+
+
+# Records for every chunk of every page, with the file name, 1-based page
+# number and the chunk's character offsets within the page
+def chunk_pages(file_name, pages, policy=PDF_CHUNK_POLICY):
+    records = []
+    for page_number, text in enumerate(pages, start=1):
+        for chunk in chunk_text(text, policy):
+            records.append({
+                'id': f"{file_name}#p{page_number}c{chunk['index']}",
+                'text': chunk['text'],
+                'metadata': {
+                    'source': file_name,
+                    'page': page_number,
+                    'chunk_index': chunk['index'],
+                    'chunk_start': chunk['start'],
+                    'chunk_end': chunk['end'],
+                },
+            })
+    return records
@@ -0,0 +1,111 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from utils.embedding_cache import EMBEDDING_MODEL, embed_texts
+
+# ===================================================================
+# In-memory LRU + TTL cache for query embeddings
+# ===================================================================
+# Every chat question gets embedded before retrieval, and many are
+# repeats: the same question from different users, or canned queries like
+# HW7's "most interesting news" risk string. This cache sits in front of
+# the SQLite embedding cache and the API and answers repeats from memory.
+# It lives at module level, so it is shared by every Streamlit session in
+# the process and is safe to use from their threads.
+#
+# Keys are (model, dimensions, normalized text). Normalizing means
+# trimming and collapsing whitespace, so "JPMorgan news" and
+# " JPMorgan   news " share an entry. Case is kept: it can change the
+# embedding ("Apple" the company, "apple" the fruit), and the normalized
+# text is also what gets embedded, so a key always maps to the vector of
+# exactly that text.
+
+DEFAULT_QUERY_CACHE_SIZE = 2048
+DEFAULT_QUERY_CACHE_TTL = 24 * 60 * 60  # seconds
+
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_query(text):
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_entries=DEFAULT_QUERY_CACHE_SIZE, ttl=DEFAULT_QUERY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (embedding, stored_at), oldest use first
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, embedding):
+        with self._lock:
+            self._entries[key] = (embedding, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+            }
+
+
+_query_cache = QueryEmbeddingCache()
+
+
+def get_query_cache():
+    return _query_cache
+
+
+# Embed several queries, answering repeats from memory. Misses go through
+# embed_texts (persistent cache, then one API call for all of them).
+def embed_queries(client, texts, model=EMBEDDING_MODEL, dimensions=None, cache=None):
+    cache = cache or _query_cache
+    normalized = [normalize_query(t) for t in texts]
+    keys = [(model, dimensions or 0, n) for n in normalized]
+    embeddings = [cache.get(key) for key in keys]
+
+    missing = list(dict.fromkeys(n for n, e in zip(normalized, embeddings) if e is None))
+    if missing:
+        vectors = dict(zip(missing, embed_texts(client, missing, model=model, dimensions=dimensions)))
+        for key, n in zip(keys, normalized):
+            if n in vectors:
+                cache.put(key, vectors[n])
+        embeddings = [e if e is not None else vectors[n] for n, e in zip(normalized, embeddings)]
+    return embeddings
+
+
+def embed_query(client, text, model=EMBEDDING_MODEL, dimensions=None):
+    return embed_queries(client, [text], model=model, dimensions=dimensions)[0]
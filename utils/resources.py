@@ -0,0 +1,160 @@
+import logging
+import os
+import sys
+import threading
+from dataclasses import asdict
+
+import streamlit as st
+from openai import OpenAI
+
+from utils.bm25 import BM25Index
+from utils.embedding_cache import EMBEDDING_MODEL
+from utils.manifest import check_manifest, load_manifest
+from utils.org_pipeline import (ORG_CHUNK_POLICY, ORG_COLLECTION_NAME, ORG_DB_PATH, ORG_SOURCE_FOLDER,
+                                list_org_files)
+from utils.retrievers import make_retriever
+from utils.risk_index import load_risk_index
+
+# ===================================================================
+# Process-wide resources shared by every page and session
+# ===================================================================
+# Clients, collections and retrievers are opened once per server process
+# with st.cache_resource instead of once per browser session in
+# st.session_state, so a new visitor gets an already-open SQLite handle
+# and an already-loaded index. warm_resources() loads the prebuilt vector
+# DBs on a background thread when the app starts, before anyone asks.
+#
+# Everything handed out here is shared across sessions and only read
+# after construction (retrievers, BM25/risk indexes), or is itself
+# thread-safe (the OpenAI and Chroma clients).
+#
+# Collections are keyed by the build_id in their manifest (when there is
+# one) so a rebuilt DB is picked up without restarting the server.
+
+NEWS_DB_PATH = './news_chroma_db'
+NEWS_COLLECTION_NAME = 'news_articles'
+
+logger = logging.getLogger(__name__)
+
+
+@st.cache_resource(show_spinner=False)
+def get_openai_client():
+    return OpenAI(api_key=st.secrets.OPENAI_API_KEY)
+
+
+@st.cache_resource(show_spinner=False)
+def get_chroma_client(path):
+    # A fix for working with ChromaDB on Streamlit Community Cloud. Imported
+    # here so pages that never touch a vector DB don't pay for chromadb.
+    if 'chromadb' not in sys.modules:
+        __import__('pysqlite3')
+        sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+    import chromadb
+    return chromadb.PersistentClient(path=path)
+
+
+def db_version(path):
+    manifest = load_manifest(path)
+    return manifest['build_id'] if manifest else None
+
+
+@st.cache_resource(show_spinner=False)
+def _get_collection(path, name, version):
+    return get_chroma_client(path).get_collection(name)
+
+
+@st.cache_resource(show_spinner=False)
+def _get_retriever(path, name, version):
+    retriever = make_retriever(_get_collection(path, name, version))
+    retriever.warm()
+    return retriever
+
+
+def get_collection(path, name):
+    return _get_collection(path, name, db_version(path))
+
+
+def get_retriever(path, name):
+    return _get_retriever(path, name, db_version(path))
+
+
+# Company names in the news collection, as (field, names), for resolving
+# the model's spelling. `companies` also holds the companies of duplicate
+# stories folded into an article; collections built before it existed
+# only have `company` until build_db.py is run again. Keyed by build_id
+# like the retriever, so a rebuild that adds a client is picked up.
+@st.cache_resource(show_spinner=False)
+def _get_company_names(path, name, version):
+    retriever = _get_retriever(path, name, version)
+    names = retriever.field_values('companies')
+    if names:
+        return 'companies', names
+    return 'company', retriever.field_values('company')
+
+
+def get_company_names(path, name):
+    return _get_company_names(path, name, db_version(path))
+
+
+# Returns None if the prebuilt org DB (HW4/HW5) matches su_orgs/ and the
+# model and chunk policy the app uses now, otherwise what is wrong.
+# Dimensions are a build option, so the manifest is checked against the
+# collection the pages will actually query.
+def check_org_db():
+    sources = list_org_files(ORG_SOURCE_FOLDER)
+    expected = {'model': EMBEDDING_MODEL, 'chunk_policy': asdict(ORG_CHUNK_POLICY)}
+    problem = check_manifest(ORG_DB_PATH, sources, **expected)
+    if problem:
+        return problem
+    dimensions = get_retriever(ORG_DB_PATH, ORG_COLLECTION_NAME).dimensions
+    return check_manifest(ORG_DB_PATH, sources, dimensions=dimensions)
+
+
+# Indexes saved as files next to a DB, reloaded when the file changes
+def _mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+@st.cache_resource(show_spinner=False)
+def _load_bm25_index(path, mtime):
+    return BM25Index.load(path) if mtime else None
+
+
+@st.cache_resource(show_spinner=False)
+def _load_risk_index(path, mtime):
+    return load_risk_index(path) if mtime else None
+
+
+def get_bm25_index(path):
+    return _load_bm25_index(path, _mtime(path))
+
+
+def get_risk_index(path):
+    return _load_risk_index(path, _mtime(path))
+
+
+# ---- Startup warm-up ----
+_warm_started = False
+_warm_lock = threading.Lock()
+
+
+def _warm():
+    for path, name in ((ORG_DB_PATH, ORG_COLLECTION_NAME), (NEWS_DB_PATH, NEWS_COLLECTION_NAME)):
+        # Not built yet; opening it would only create an empty DB
+        if not os.path.exists(os.path.join(path, 'chroma.sqlite3')):
+            continue
+        try:
+            get_retriever(path, name)
+        except Exception as e:
+            # Missing or broken DB: the page that needs it reports the problem
+            logger.warning("Could not warm %s/%s: %s", path, name, e)
+
+
+# Start loading the prebuilt vector DBs in the background, once per process
+def warm_resources():
+    global _warm_started
+    with _warm_lock:
+        if _warm_started:
+            return
+        _warm_started = True
+    threading.Thread(target=_warm, name='warm-resources', daemon=True).start()
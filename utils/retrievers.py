@@ -0,0 +1,357 @@
+import os
+
+import numpy as np
+
+from utils.vectors import normalize_rows
+
+# ===================================================================
+# Pluggable retrievers: ChromaDB or in-process NumPy exact search
+# ===================================================================
+# Both classes answer query() with the same arguments and the same result
+# shape as chromadb's Collection.query, so pages can swap one for the
+# other without changing how they read results:
+#   {'ids': [[...]], 'documents': [[...]], 'metadatas': [[...]], 'distances': [[...]]}
+# (one inner list per query embedding).
+#
+# Our corpora are small (about a thousand vectors each), so the NumPy
+# backend keeps every vector L2-normalized in one contiguous float32
+# matrix and answers a query with a single matrix product plus
+# argpartition. Several queries at once become one matrix-matrix product.
+# Distances are cosine distances (1 - cosine similarity).
+#
+# Vectors can be stored quantized to shrink the in-memory index:
+#   'int8'   - one signed byte per dimension with a per-dimension scale (4x smaller)
+#   'binary' - one sign bit per dimension, scored by Hamming distance (32x smaller)
+# Quantized search over-fetches rescore_factor * k candidates and, when the
+# retriever was loaded from a collection, rescores them exactly with their
+# full-precision vectors read back from Chroma. Combined with shortened
+# embeddings (build scripts' --dimensions, recorded in the collection
+# metadata as 'embedding_dimensions') int8 at 256 dimensions is 24x
+# smaller than full-size float32; see benchmarks/bench_quantization.py
+# for footprint and recall@5 of each combination.
+#
+# Metadata filters use the subset of Chroma's `where` syntax our pages
+# need: {'field': value}, {'field': {'$eq' | '$ne' | '$in' | '$gt' |
+# '$gte' | '$lt' | '$lte': value}}, {'field': {'$contains': value}} for
+# list-valued fields, and {'$and' | '$or': [...]}. Equality, $in and
+# $contains look rows up in a per-field value -> rows index built on first
+# use (a list value is indexed under each of its items), so a company
+# filter only scores that company's vectors.
+
+RETRIEVER_BACKEND = os.environ.get('RAG_RETRIEVER_BACKEND', 'numpy')
+QUANTIZATION = os.environ.get('RAG_QUANTIZATION') or None  # None, 'int8' or 'binary'
+QUANTIZATIONS = (None, 'int8', 'binary')
+DEFAULT_RESCORE_FACTOR = 4
+
+DEFAULT_INCLUDE = ('documents', 'metadatas', 'distances')
+
+
+_RANGE_OPS = {
+    '$gt': np.greater,
+    '$gte': np.greater_equal,
+    '$lt': np.less,
+    '$lte': np.less_equal,
+}
+
+
+# The values of a metadata field: the items of a list value, else the value
+def _field_items(value):
+    return value if isinstance(value, list) else [value]
+
+
+# Shortened-embedding size a collection was built with (None = model default)
+def collection_dimensions(collection):
+    return (collection.metadata or {}).get('embedding_dimensions')
+
+
+# Returns None if the collection `name` doesn't exist yet or was built with
+# `dimensions`, otherwise a short description of the mismatch. A
+# collection's vectors all have one size, so changing dimensions means
+# re-embedding everything.
+def check_collection_dimensions(chroma_client, name, dimensions):
+    try:
+        existing = chroma_client.get_collection(name)
+    except Exception:
+        return None
+    built_with = collection_dimensions(existing)
+    if built_with != dimensions:
+        return (f"The collection was built with dimensions={built_with}, "
+                f"not {dimensions}. Run again with --rebuild to re-embed it.")
+    return None
+
+
+def _popcount(values):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return _POPCOUNT_TABLE[values]
+
+
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+class ChromaRetriever:
+    def __init__(self, collection):
+        self.collection = collection
+        self.dimensions = collection_dimensions(collection)
+
+    def count(self):
+        return self.collection.count()
+
+    # Load the HNSW segment now rather than on the first real query
+    def warm(self):
+        sample = self.collection.get(limit=1, include=['embeddings'])
+        if len(sample['ids']):
+            self.collection.query(query_embeddings=[sample['embeddings'][0]], n_results=1, include=[])
+
+    def query(self, query_embeddings, n_results=5, where=None, include=DEFAULT_INCLUDE):
+        kwargs = {'where': where} if where else {}
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            include=list(include),
+            **kwargs
+        )
+
+    def get(self, ids, include=('documents', 'metadatas')):
+        return self.collection.get(ids=list(ids), include=list(include))
+
+    def ids_matching(self, where):
+        return self.collection.get(where=where, include=[])['ids']
+
+    def field_values(self, field):
+        metadatas = self.collection.get(include=['metadatas'])['metadatas']
+        return sorted({item for m in metadatas if m and field in m for item in _field_items(m[field])})
+
+
+class NumpyRetriever:
+    def __init__(self, ids, embeddings, documents, metadatas, quantization=None,
+                 rescore_collection=None, rescore_factor=DEFAULT_RESCORE_FACTOR, dimensions=None):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = list(metadatas)
+        self.dimensions = dimensions
+        self.quantization = quantization
+        self.rescore_collection = rescore_collection
+        self.rescore_factor = rescore_factor
+
+        vectors = np.ascontiguousarray(
+            normalize_rows(embeddings), dtype=np.float32
+        )
+        self.n_dims = vectors.shape[1]
+        self.matrix = None  # full precision, only kept when not quantized
+        if quantization is None:
+            self.matrix = vectors
+        elif quantization == 'int8':
+            # Symmetric per-dimension scale so every dimension uses the full byte
+            self.scales = np.abs(vectors).max(axis=0) / 127.0 if len(vectors) else np.ones(self.n_dims)
+            self.scales[self.scales == 0] = 1.0
+            self.scales = self.scales.astype(np.float32)
+            self.codes = np.round(vectors / self.scales).astype(np.int8)
+        else:
+            self.codes = np.packbits(vectors > 0, axis=1)
+
+        self._row_by_id = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._value_index = {}  # field -> {value: row indices}
+        self._columns = {}      # field -> float array, NaN where missing
+
+    # Load every vector from a Chroma collection, a page at a time
+    @classmethod
+    def from_collection(cls, collection, page_size=5000, quantization=None, rescore=True):
+        ids, embeddings, documents, metadatas = [], [], [], []
+        total = collection.count()
+        for offset in range(0, total, page_size):
+            page = collection.get(
+                include=['embeddings', 'documents', 'metadatas'],
+                limit=page_size,
+                offset=offset
+            )
+            ids.extend(page['ids'])
+            embeddings.extend(page['embeddings'])
+            documents.extend(page['documents'])
+            metadatas.extend(page['metadatas'] or [None] * len(page['ids']))
+        if not ids:
+            embeddings = np.zeros((0, 1), dtype=np.float32)
+        return cls(ids, embeddings, documents, metadatas, quantization=quantization,
+                   rescore_collection=collection if quantization and rescore else None,
+                   dimensions=collection_dimensions(collection))
+
+    # Bytes used by the searchable vectors
+    def index_nbytes(self):
+        return self.matrix.nbytes if self.matrix is not None else self.codes.nbytes
+
+    def count(self):
+        return len(self.ids)
+
+    # Nothing to do: every vector is loaded in the constructor
+    def warm(self):
+        pass
+
+    # Approximate (or, unquantized, exact) similarities of queries to rows
+    def _scores(self, queries, rows):
+        if self.quantization is None:
+            matrix = self.matrix if rows is None else self.matrix[rows]
+            return queries @ matrix.T
+        codes = self.codes if rows is None else self.codes[rows]
+        if self.quantization == 'int8':
+            # Widen to float32 per query so the product runs through BLAS
+            # (mixed int8/float matmul takes a much slower generic path)
+            return (queries * self.scales) @ codes.astype(np.float32).T
+        # Cosine of the sign vectors is 1 - 2 * hamming / dims
+        query_bits = np.packbits(queries > 0, axis=1)
+        hamming = _popcount(query_bits[:, None, :] ^ codes[None, :, :]).sum(axis=2)
+        return 1.0 - 2.0 * hamming.astype(np.float32) / self.n_dims
+
+    # Full-precision unit vectors for rows, or the dequantized approximation
+    # when there is nowhere to read them from
+    def _vectors(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.matrix is not None:
+            return self.matrix[rows]
+        if self.rescore_collection is not None and len(rows):
+            ids = [self.ids[i] for i in rows]
+            stored = self.rescore_collection.get(ids=ids, include=['embeddings'])
+            by_id = dict(zip(stored['ids'], stored['embeddings']))
+            if all(doc_id in by_id for doc_id in ids):
+                return normalize_rows(np.asarray([by_id[doc_id] for doc_id in ids], dtype=np.float32))
+        if self.quantization == 'int8':
+            return normalize_rows(self.codes[rows] * self.scales)
+        return np.unpackbits(self.codes[rows], axis=1, count=self.n_dims).astype(np.float32) * 2 - 1
+
+    @staticmethod
+    def _top(scores, k):
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    # Indices and similarities of the top k rows for each query, best
+    # first. `rows` restricts the search to a subset of row indices.
+    def search(self, query_embeddings, k, rows=None):
+        queries = normalize_rows(query_embeddings)
+        n_rows = len(self.ids) if rows is None else len(rows)
+        k = min(k, n_rows)
+        if k == 0:
+            return [np.array([], dtype=np.int64) for _ in queries], [np.array([]) for _ in queries]
+
+        rescore = self.quantization is not None and self.rescore_collection is not None
+        fetch = min(n_rows, k * self.rescore_factor) if rescore else k
+        # (n_queries, n_vectors) similarity matrix in one product
+        top, top_scores = self._top(self._scores(queries, rows), fetch)
+        if rows is not None:
+            top = rows[top]
+        if not rescore:
+            return list(top), list(top_scores)
+
+        # Exact scores for the candidates, fetched once for all queries
+        candidates = np.unique(top)
+        exact = queries @ self._vectors(candidates).T
+        exact = np.take_along_axis(exact, np.searchsorted(candidates, top), axis=1)
+        best, best_scores = self._top(exact, k)
+        return list(np.take_along_axis(top, best, axis=1)), list(best_scores)
+
+    # ---- Metadata filtering ----
+    def _rows_by_value(self, field):
+        if field not in self._value_index:
+            index = {}
+            for i, meta in enumerate(self.metadatas):
+                if meta and field in meta:
+                    for item in _field_items(meta[field]):
+                        index.setdefault(item, []).append(i)
+            self._value_index[field] = {v: np.array(r, dtype=np.int64) for v, r in index.items()}
+        return self._value_index[field]
+
+    def _column(self, field):
+        if field not in self._columns:
+            self._columns[field] = np.array(
+                [meta.get(field, np.nan) if meta else np.nan for meta in self.metadatas],
+                dtype=np.float64
+            )
+        return self._columns[field]
+
+    def _mask(self, field, condition):
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        mask = np.ones(len(self.ids), dtype=bool)
+        for op, value in condition.items():
+            if op in ('$eq', '$in', '$contains'):
+                values = value if op == '$in' else [value]
+                index = self._rows_by_value(field)
+                keep = np.zeros(len(self.ids), dtype=bool)
+                for v in values:
+                    keep[index.get(v, [])] = True
+                mask &= keep
+            elif op == '$ne':
+                mask &= np.array([not meta or meta.get(field) != value for meta in self.metadatas])
+            elif op in _RANGE_OPS:
+                with np.errstate(invalid='ignore'):
+                    mask &= _RANGE_OPS[op](self._column(field), value)
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+        return mask
+
+    def _where_mask(self, where):
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, condition in where.items():
+            if key == '$and':
+                for clause in condition:
+                    mask &= self._where_mask(clause)
+            elif key == '$or':
+                either = np.zeros(len(self.ids), dtype=bool)
+                for clause in condition:
+                    either |= self._where_mask(clause)
+                mask &= either
+            else:
+                mask &= self._mask(key, condition)
+        return mask
+
+    # Row indices matching a `where` filter
+    def filter_rows(self, where):
+        return np.flatnonzero(self._where_mask(where))
+
+    def ids_matching(self, where):
+        return [self.ids[i] for i in self.filter_rows(where)]
+
+    def field_values(self, field):
+        return sorted(self._rows_by_value(field))
+
+    def _result(self, rows_per_query, scores_per_query, include):
+        result = {'ids': [[self.ids[i] for i in rows] for rows in rows_per_query]}
+        if 'documents' in include:
+            result['documents'] = [[self.documents[i] for i in rows] for rows in rows_per_query]
+        if 'metadatas' in include:
+            result['metadatas'] = [[self.metadatas[i] for i in rows] for rows in rows_per_query]
+        if 'distances' in include:
+            result['distances'] = [[float(1.0 - s) for s in scores] for scores in scores_per_query]
+        if 'embeddings' in include:
+            result['embeddings'] = [self._vectors(rows) for rows in rows_per_query]
+        return result
+
+    def query(self, query_embeddings, n_results=5, where=None, include=DEFAULT_INCLUDE):
+        rows, scores = self.search(query_embeddings, n_results,
+                                   self.filter_rows(where) if where else None)
+        return self._result(rows, scores, include)
+
+    def get(self, ids, include=('documents', 'metadatas')):
+        rows = [self._row_by_id[doc_id] for doc_id in ids if doc_id in self._row_by_id]
+        result = {'ids': [self.ids[i] for i in rows]}
+        if 'documents' in include:
+            result['documents'] = [self.documents[i] for i in rows]
+        if 'metadatas' in include:
+            result['metadatas'] = [self.metadatas[i] for i in rows]
+        if 'embeddings' in include:
+            result['embeddings'] = self._vectors(rows)
+        return result
+
+
+# Wrap a Chroma collection in the configured backend
+# (set RAG_RETRIEVER_BACKEND=chroma to query Chroma directly, and
+# RAG_QUANTIZATION=int8 or binary to quantize the NumPy index)
+def make_retriever(collection, backend=None, quantization=None):
+    backend = backend or RETRIEVER_BACKEND
+    if backend == 'numpy':
+        return NumpyRetriever.from_collection(collection, quantization=quantization or QUANTIZATION)
+    if backend == 'chroma':
+        return ChromaRetriever(collection)
+    raise ValueError(f"Unknown retriever backend: {backend}")
@@ -0,0 +1,60 @@
+import json
+import os
+
+import numpy as np
+
+from utils.vectors import normalize_rows
+
+# ===================================================================
+# Precomputed "interestingness" ranking for the news collection
+# ===================================================================
+# HW7's find_interesting_news used to embed a fixed risk query and run a
+# similarity search on every call, even though the answer only changes
+# when the corpus does. build_db.py now scores every article against that
+# query once, at ingest time, and saves the articles sorted by score. The
+# tool then just reads the first k IDs: no embedding call, no vector search.
+#
+# score = cosine(article, risk query) + recency_weight * 0.5 ** (age / half_life)
+# where age is days behind the newest article. An article split into
+# several chunks is scored by its best chunk.
+
+RISK_INDEX_NAME = 'risk_index.json'
+RISK_QUERY = "significant legal regulatory financial risk lawsuit controversy scandal"
+
+DEFAULT_RECENCY_WEIGHT = 0.05
+DEFAULT_RECENCY_HALF_LIFE = 30  # days
+
+
+# Returns [(doc ID, score), ...] sorted best first, one entry per article
+def rank_by_risk(ids, embeddings, metadatas, query_embedding,
+                 recency_weight=DEFAULT_RECENCY_WEIGHT, half_life=DEFAULT_RECENCY_HALF_LIFE):
+    if not ids:
+        return []
+    scores = normalize_rows(embeddings) @ normalize_rows(query_embedding)[0]
+
+    days = np.array([(m or {}).get('day', np.nan) for m in metadatas], dtype=np.float64)
+    if recency_weight and not np.all(np.isnan(days)):
+        age = np.nan_to_num(np.nanmax(days) - days, nan=np.inf)
+        scores = scores + recency_weight * 0.5 ** (age / half_life)
+
+    # Keep the best chunk of each article
+    best = {}
+    for doc_id, score in zip(ids, scores.tolist()):
+        article = doc_id.split('#', 1)[0]
+        if article not in best or score > best[article][1]:
+            best[article] = (doc_id, score)
+    return sorted(best.values(), key=lambda item: item[1], reverse=True)
+
+
+def save_risk_index(path, ranked, **fields):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({**fields, 'ranked': ranked}, f)
+    os.replace(tmp_path, path)
+
+
+def load_risk_index(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,150 @@
+import inspect
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from utils.query_cache import embed_query, normalize_query
+from utils.vectors import cosine
+
+# ===================================================================
+# Speculative retrieval alongside the tool-decision call
+# ===================================================================
+# A retrieval tool normally starts only after the model has streamed its
+# tool call, so embedding and vector search add to the LLM round trip.
+# When speculation is on, the raw user prompt is embedded and run through
+# the tool on a background thread as soon as the turn starts, while the
+# model is still deciding. If the model then calls the tool with a query
+# close enough to the prompt (cosine similarity of the two embeddings at
+# or above the threshold), and with every other argument at its default,
+# the prefetched result is returned instead of searching again. Otherwise
+# it is discarded and the tool runs as usual.
+#
+# Off by default: a miss costs an extra embedding and search. Turn it on
+# with RAG_SPECULATIVE_RETRIEVAL=1 (HW7 also has a sidebar switch).
+# Outcomes are counted process-wide; get_speculation_stats() reports how
+# often a speculation was used (hit), replaced by a different search
+# (miss), or never asked for because the tool wasn't called (unused).
+
+SPECULATIVE_RETRIEVAL = os.environ.get('RAG_SPECULATIVE_RETRIEVAL', '') == '1'
+DEFAULT_SPECULATION_THRESHOLD = float(os.environ.get('RAG_SPECULATION_THRESHOLD', 0.9))
+SPECULATION_WORKERS = 4
+
+# Shared by every session; speculations are short and mostly waiting on I/O
+_pool = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS, thread_name_prefix='speculate')
+
+
+class SpeculationStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.unused = 0
+        self._lock = threading.Lock()
+
+    def record(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses + self.unused
+            used = self.hits + self.misses
+            return {
+                'speculations': total,
+                'hits': self.hits,
+                'misses': self.misses,
+                'unused': self.unused,
+                'hit_rate': self.hits / total if total else 0.0,
+                # Of the turns where the tool was called at all
+                'hit_rate_when_called': self.hits / used if used else 0.0,
+            }
+
+
+_speculation_stats = SpeculationStats()
+
+
+def get_speculation_stats():
+    return _speculation_stats
+
+
+class SpeculativeRetrieval:
+    # function: the retrieval tool; query_arg: its argument holding the
+    # search text; dimensions: embedding size the tool queries with
+    def __init__(self, client, function, query_arg='query', dimensions=None,
+                 threshold=DEFAULT_SPECULATION_THRESHOLD, stats=None):
+        self.client = client
+        self.function = function
+        self.query_arg = query_arg
+        self.dimensions = dimensions
+        self.threshold = threshold
+        self.stats = stats or _speculation_stats
+        self._signature = inspect.signature(function)
+        self._defaults = self._other_args({query_arg: ''})
+        self.prompt = None
+        self._embedding = None
+        self._result = None
+        self._called = False
+        self._hit = False
+
+    # The tool's arguments other than the query, with defaults filled in
+    def _other_args(self, args):
+        bound = self._signature.bind(**args)
+        bound.apply_defaults()
+        return {name: value for name, value in bound.arguments.items() if name != self.query_arg}
+
+    # Embed the prompt, publish the embedding for _matches, then search.
+    # One pool task, so a speculation never waits on another queued task.
+    def _speculate(self, prompt):
+        try:
+            embedding = embed_query(self.client, prompt, dimensions=self.dimensions)
+        except Exception as e:
+            self._embedding.set_exception(e)
+            raise
+        self._embedding.set_result(embedding)
+        # The tool embeds the prompt again; that is answered from the query cache
+        return self.function(**{self.query_arg: prompt})
+
+    # Start embedding and searching for the prompt in the background
+    def start(self, prompt):
+        self.prompt = prompt
+        self._embedding = Future()
+        self._result = _pool.submit(self._speculate, prompt)
+
+    def _matches(self, args):
+        query = args.get(self.query_arg)
+        if self._result is None or not query:
+            return False
+        try:
+            if self._other_args(args) != self._defaults:
+                return False
+        except TypeError:
+            # Arguments the tool doesn't take; let the normal call report it
+            return False
+        if normalize_query(query) == normalize_query(self.prompt):
+            return True
+        try:
+            prompt_embedding = self._embedding.result()
+        except Exception:
+            return False
+        query_embedding = embed_query(self.client, query, dimensions=self.dimensions)
+        return cosine(query_embedding, prompt_embedding) >= self.threshold
+
+    # Use in place of the tool function, e.g. in a ToolExecutor
+    def tool(self, **args):
+        self._called = True
+        if self._matches(args):
+            try:
+                result = self._result.result()
+            except Exception:
+                # The speculative search failed; search again for real
+                pass
+            else:
+                self._hit = True
+                return result
+        return self.function(**args)
+
+    # Record how the speculation turned out; call once at the end of the turn
+    def finish(self):
+        if self._result is None:
+            return
+        self.stats.record('hits' if self._hit else 'misses' if self._called else 'unused')
+        self._result = None
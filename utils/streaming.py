@@ -0,0 +1,115 @@
+import streamlit as st
+
+from utils.tool_executor import assistant_message
+
+# ===================================================================
+# One streamed completion per round, tool calls included
+# ===================================================================
+# Instead of a blocking call to find out whether the model wants a tool
+# followed by a second, streamed call for the answer, each round is a
+# single streamed request with the tools attached. Content deltas are
+# yielded as soon as they arrive (so st.write_stream shows the first token
+# right away, and an answer that needs no tool is streamed end to end),
+# while tool_call deltas are assembled as they come in. When the stream
+# ends with tool calls, the tools run and the next round is streamed.
+#
+# Everything here runs on the script thread that iterates the generator,
+# so the on_tool_results callback may draw Streamlit elements.
+
+DEFAULT_MAX_ROUNDS = 3
+
+
+# Add one streamed tool_call fragment to the calls assembled so far. The
+# first fragment of a call carries its id and name; the arguments JSON
+# arrives in pieces that are concatenated.
+def _add_tool_call_delta(calls, delta):
+    while len(calls) <= delta.index:
+        calls.append({'id': None, 'type': 'function', 'function': {'name': '', 'arguments': ''}})
+    call = calls[delta.index]
+    if delta.id:
+        call['id'] = delta.id
+    function = delta.function
+    if function is not None:
+        if function.name:
+            call['function']['name'] += function.name
+        if function.arguments:
+            call['function']['arguments'] += function.arguments
+
+
+# Stream one completion, yielding its content deltas. Tool calls the model
+# makes are assembled into the `tool_calls` list passed in (if any).
+def stream_completion(client, model, messages, tools=None, tool_calls=None):
+    kwargs = {'tools': tools, 'tool_choice': 'auto'} if tools else {}
+    stream = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        stream=True,
+        **kwargs
+    )
+    for chunk in stream:
+        # The final usage chunk, if requested, has no choices
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            yield delta.content
+        if delta.tool_calls and tool_calls is not None:
+            for call_delta in delta.tool_calls:
+                _add_tool_call_delta(tool_calls, call_delta)
+
+
+# Stream the answer to `messages`, letting the model call tools for up to
+# max_rounds rounds. Tool requests and results are appended to `messages`;
+# on_tool_results(tool_calls, tool_messages) runs after each tool round,
+# and `spinner` is shown while the tools run.
+# When the round cap is hit, a final answer is streamed without tools.
+# answer_cache (a ToolAnswerCache) is asked for an answer after the first
+# tool round; a cached answer ends the turn there, otherwise what is
+# streamed after that round is stored in it.
+# Meant for st.write_stream, which returns the full text.
+def stream_with_tools(client, model, messages, tools, executor,
+                      max_rounds=DEFAULT_MAX_ROUNDS, on_tool_results=None, spinner=None,
+                      answer_cache=None):
+    answer = None  # text streamed after the first tool round, for answer_cache
+    for round_index in range(max_rounds):
+        tool_calls = []
+        content = []
+        for text in stream_completion(client, model, messages, tools, tool_calls):
+            content.append(text)
+            if answer is not None:
+                answer.append(text)
+            yield text
+        if not tool_calls:
+            break
+
+        messages.append(assistant_message({'content': ''.join(content) or None, 'tool_calls': tool_calls}))
+        if spinner:
+            with st.spinner(spinner):
+                results = executor.run(tool_calls)
+        else:
+            results = executor.run(tool_calls)
+        messages.extend(results)
+        if on_tool_results is not None:
+            on_tool_results(tool_calls, results)
+        # Keep any text the model wrote before calling tools apart from
+        # what comes next
+        if content:
+            if answer is not None:
+                answer.append("\n\n")
+            yield "\n\n"
+
+        if answer_cache is not None and round_index == 0:
+            cached = answer_cache.get(tool_calls, results)
+            if cached is not None:
+                yield cached
+                return
+            answer = []
+    else:
+        # Round cap reached: answer from what has been looked up so far
+        for text in stream_completion(client, model, messages):
+            if answer is not None:
+                answer.append(text)
+            yield text
+
+    if answer is not None:
+        answer_cache.put(''.join(answer))
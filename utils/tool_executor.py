@@ -0,0 +1,97 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.query_cache import embed_queries
+
+# ===================================================================
+# Parallel tool execution for function-calling chat pages
+# ===================================================================
+# The model can ask for several tools in one turn (e.g. find_news_about
+# for three companies). ToolExecutor runs all of them at once on a thread
+# pool and returns one tool message per call, in order, so nothing is
+# dropped and the follow-up completion sees every result.
+#
+# Tools that search the vector DB start by embedding a query. Before the
+# tools run, every query argument in the turn is embedded in a single
+# request through the shared query cache, so each tool's own embed call
+# is then answered from memory.
+#
+# Tool calls can be SDK objects or plain dicts; both are handled.
+
+DEFAULT_TOOL_WORKERS = 8
+
+
+def _field(obj, name):
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+# (id, function name, parsed arguments) of one tool call
+def parse_tool_call(tool_call):
+    function = _field(tool_call, 'function')
+    try:
+        args = json.loads(_field(function, 'arguments') or '{}')
+    except json.JSONDecodeError:
+        args = None
+    return _field(tool_call, 'id'), _field(function, 'name'), args
+
+
+# The assistant message that requested the tools, as a plain dict we can
+# send back with the tool results
+def assistant_message(message):
+    tool_calls = []
+    for call in _field(message, 'tool_calls'):
+        function = _field(call, 'function')
+        tool_calls.append({
+            'id': _field(call, 'id'),
+            'type': 'function',
+            'function': {'name': _field(function, 'name'), 'arguments': _field(function, 'arguments')},
+        })
+    return {'role': 'assistant', 'content': _field(message, 'content'), 'tool_calls': tool_calls}
+
+
+class ToolExecutor:
+    # functions: tool name -> Python function called with the tool's arguments
+    # embed_args: tool name -> argument holding text the tool will embed
+    # dimensions: embedding size the tools query with (None = model default)
+    def __init__(self, functions, client=None, embed_args=None, dimensions=None,
+                 max_workers=DEFAULT_TOOL_WORKERS):
+        self.functions = functions
+        self.client = client
+        self.embed_args = embed_args or {}
+        self.dimensions = dimensions
+        self.max_workers = max_workers
+
+    def _call(self, name, args):
+        if name not in self.functions:
+            return f"Error: unknown tool '{name}'."
+        if args is None:
+            return "Error: the tool arguments were not valid JSON."
+        try:
+            return str(self.functions[name](**args))
+        except Exception as e:
+            # Report the failure to the model instead of crashing the page
+            return f"Error running {name}: {e}"
+
+    # Embed every query in the turn with one request, warming the query cache
+    def _prefetch_embeddings(self, calls):
+        texts = [
+            args[self.embed_args[name]] for _, name, args in calls
+            if args and name in self.embed_args and args.get(self.embed_args[name])
+        ]
+        if self.client is not None and len(texts) > 1:
+            embed_queries(self.client, texts, dimensions=self.dimensions)
+
+    # Run every tool call concurrently; returns the tool messages in call order
+    def run(self, tool_calls):
+        calls = [parse_tool_call(call) for call in tool_calls]
+        self._prefetch_embeddings(calls)
+        if len(calls) == 1:
+            results = [self._call(calls[0][1], calls[0][2])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(calls))) as pool:
+                results = list(pool.map(lambda call: self._call(call[1], call[2]), calls))
+        return [
+            {'role': 'tool', 'tool_call_id': call_id, 'content': result}
+            for (call_id, _, _), result in zip(calls, results)
+        ]
+
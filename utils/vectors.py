@@ -0,0 +1,21 @@
+import numpy as np
+
+# ===================================================================
+# Vector helpers shared by the retrievers, MMR and the caches
+# ===================================================================
+# Everything here compares embeddings by cosine similarity, which is the
+# dot product of unit vectors. Zero vectors are left as they are instead
+# of dividing by zero, so they are simply dissimilar to everything.
+
+
+# A float32 matrix with each row scaled to unit length. Takes a single
+# vector too (returned as a one-row matrix).
+def normalize_rows(vectors):
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def cosine(a, b):
+    return float(normalize_rows(a)[0] @ normalize_rows(b)[0])